@@ -1,24 +1,166 @@
 # app/__init__.py
 import os
+import threading
 from importlib import import_module
-from tkinter import Image
-from flask import Flask, jsonify, current_app, send_file
-from flask_sqlalchemy import SQLAlchemy
-from flask_jwt_extended import JWTManager
-from .logging_utils import configure_file_logging, record_audit
+from flask import Flask, jsonify, current_app, send_file, send_from_directory
+from flask.json.provider import JSONProvider
+
+try:
+    import orjson  # pip install orjson
+except Exception:
+    orjson = None
 from .extensions import db, jwt
 import uuid, time
 from flask import request, g
 from werkzeug.exceptions import HTTPException
 from datetime import timedelta
-#db = SQLAlchemy()
-jwt = JWTManager()
 
+__all__ = ["create_app", "db", "jwt", "get_vec_model", "get_faiss_store"]
+
+
+class _OrjsonProvider(JSONProvider):
+    """orjson 序列化（比 stdlib json 快数倍），所有 jsonify 调用点自动受益。"""
+
+    # OPT_SERIALIZE_NUMPY：ndarray / np 标量直接在 C 层序列化，
+    # 视图层不必为了 jsonify 先 .tolist() 把每个 float 拆成 Python 对象
+    _OPTS = None  # 延迟求值：orjson 可能没装
+
+    @classmethod
+    def _opts(cls):
+        if cls._OPTS is None:
+            cls._OPTS = orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+        return cls._OPTS
+
+    def dumps(self, obj, **kwargs):
+        return orjson.dumps(obj, option=self._opts()).decode()
+
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
+    def response(self, *args, **kwargs):
+        # jsonify 直接拿 orjson 的 bytes 当响应体，
+        # 省掉 dumps().decode() 再被 werkzeug encode 回 UTF-8 的一来一回
+        obj = self._prepare_response_obj(args, kwargs)
+        body = orjson.dumps(obj, option=self._opts())
+        return self._app.response_class(body, mimetype="application/json")
+
+
+class _LazyResources:
+    """
+    重组件（VecModel + FaissStore）的懒加载容器：
+      - create_app 只登记，不加载；首个用到向量检索的请求才真正初始化；
+      - Lock + Event 保证并发首请求只跑一次加载，其余请求等待同一个 loader；
+      - 轻量模式（light/LIGHT_MODE=1）恒为 None，与老行为一致。
+    """
+
+    def __init__(self, app, light: bool):
+        self._app = app
+        self._light = light
+        self._lock = threading.Lock()
+        self._ready = threading.Event()
+        self.vec_model = None
+        self.faiss_store = None
+        if light:
+            # 轻量模式没有要加载的东西
+            self._ready.set()
+
+    def ensure(self):
+        if self._ready.is_set():
+            return
+        if self._lock.acquire(blocking=False):
+            try:
+                if not self._ready.is_set():
+                    self._load()
+            finally:
+                self._ready.set()
+                self._lock.release()
+        else:
+            # 另一个请求正在加载：等它完成，避免并发初始化 torch
+            self._ready.wait()
+
+    def _load(self):
+        app = self._app
+        try:
+            from .vec import VecModel
+            vec_model = VecModel(app.config["EMBED_MODEL"], app.config["EMBED_DEVICE"])
+        except Exception as e:
+            app.logger.warning(f"[vec] model load failed: {e}")
+            return
+
+        # 维度以模型为准（VecModel 构造时已对已知模型做过一致性校验），
+        # 缓存进 config 供蓝图直接读取，不再各处兜底猜 512
+        embed_dim = int(vec_model.dim)
+        app.config["EMBED_DIM"] = embed_dim
+
+        from .faiss_store import FaissStore
+        faiss_store = FaissStore(
+            dim=embed_dim,
+            index_path=app.config["FAISS_INDEX_PATH"],
+            index_factory_str=app.config.get("FAISS_INDEX_FACTORY"),
+            nprobe=app.config.get("FAISS_NPROBE"),
+            autosave=app.config.get("FAISS_AUTOSAVE", True),
+            efsearch=app.config.get("FAISS_EFSEARCH"),
+        )
+
+        # 宽容加载：有 load() 就调；否则交由后续脚本/首次写入时处理
+        try:
+            if hasattr(faiss_store, "load"):
+                try:
+                    faiss_store.load(mmap=app.config["FAISS_MMAP"])
+                except TypeError:
+                    faiss_store.load()  # 老签名不收 mmap 参数
+                app.logger.info(
+                    "[faiss] index loaded (path=%s, dim=%s, ntotal=%s)",
+                    app.config["FAISS_INDEX_PATH"],
+                    getattr(faiss_store, "dim", None),
+                    getattr(faiss_store, "ntotal", None),
+                )
+            else:
+                app.logger.warning("[faiss] FaissStore has no load(); skip explicit load")
+        except Exception as e:
+            app.logger.warning("[faiss] failed to load index (%s); you can rebuild later", e)
+
+        # FAISS_PREWARM=1：后台线程预读 mmap 页，首查不吃 page-fault 延迟
+        # （低内存开发机默认不开）
+        if app.config.get("FAISS_PREWARM") and hasattr(faiss_store, "prewarm"):
+            threading.Thread(target=faiss_store.prewarm, daemon=True).start()
+
+        self.vec_model = vec_model
+        self.faiss_store = faiss_store
+        # 兼容仍直接读 extensions 的旧代码
+        app.extensions["vec_model"] = vec_model
+        app.extensions["faiss_store"] = faiss_store
+
+
+def get_vec_model(app):
+    """取向量模型；首个调用触发加载（轻量模式返回 None）。"""
+    res = app.extensions.get("lazy_resources")
+    if res is None:
+        return app.extensions.get("vec_model")
+    res.ensure()
+    return res.vec_model
+
+
+def get_faiss_store(app):
+    """取 FAISS 索引；首个调用触发加载（轻量模式返回 None）。"""
+    res = app.extensions.get("lazy_resources")
+    if res is None:
+        return app.extensions.get("faiss_store")
+    res.ensure()
+    return res.faiss_store
 
 
 def create_app(light: bool = False):
+    # 放在函数里而不是模块顶：logging_utils 连带 models/JWT 一串导入，
+    # 让 `import app`（CLI、pytest 收集）保持便宜
+    from .logging_utils import configure_file_logging, record_audit
+
     app = Flask(__name__)
 
+    # orjson 可用时替换默认 JSON provider；没装则沿用 stdlib
+    if orjson is not None:
+        app.json = _OrjsonProvider(app)
+
     # ---------- Core config ----------
     app.config["SECRET_KEY"] = os.environ.get("SECRET_KEY", "dev-secret")
     app.config["JWT_SECRET_KEY"] = os.environ.get("JWT_SECRET_KEY", "dev-jwt-secret")
@@ -28,12 +170,8 @@ def create_app(light: bool = False):
     app.config.setdefault("JWT_REFRESH_TOKEN_EXPIRES", timedelta(days=7))
 
     # 主业务库（图片/向量等），默认走 instance/image_drive.db；也兼容外部传入 DATABASE_URL
-    #暂时修改default_image_db = f"sqlite:///{os.path.abspath(os.path.join(app.instance_path, 'image_drive.db')).replace('\\','/')}"
-    # app/__init__.py 修改为：
     path = os.path.abspath(os.path.join(app.instance_path, 'image_drive.db')).replace('\\', '/')
     default_image_db = f"sqlite:///{path}"
-    app.config["SQLALCHEMY_DATABASE_URI"] = os.environ.get("DATABASE_URL", default_image_db)
-
     app.config["SQLALCHEMY_DATABASE_URI"] = os.environ.get("DATABASE_URL", default_image_db)
     app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
 
@@ -41,22 +179,27 @@ def create_app(light: bool = False):
     os.makedirs(app.instance_path, exist_ok=True)
 
     # 单独的认证库（auth.db），可通过 AUTH_DB 覆盖
-    #暂时替换
     auth_db_file = os.environ.get("AUTH_DB", os.path.join(app.instance_path, "auth.db"))
     auth_path = os.path.abspath(auth_db_file).replace('\\', '/')
     app.config["SQLALCHEMY_BINDS"] = {"auth": f"sqlite:///{auth_path}"}
 
-    """auth_db_file = os.environ.get("AUTH_DB", os.path.join(app.instance_path, "auth.db"))
-    app.config["SQLALCHEMY_BINDS"] = {
-        "auth": f"sqlite:///{os.path.abspath(auth_db_file).replace('\\','/')}"
-    }"""
-
     # 资源目录（上传与缩略图）
     app.config["UPLOAD_DIR"] = os.path.abspath(os.environ.get("UPLOAD_DIR", "data/images"))
     app.config["THUMB_DIR"] = os.path.abspath(os.environ.get("THUMB_DIR", "data/thumbs"))
     os.makedirs(app.config["UPLOAD_DIR"], exist_ok=True)
     os.makedirs(app.config["THUMB_DIR"], exist_ok=True)
 
+    # data 根目录（仓储路径自愈用）：启动时 abspath 一次，请求处理里只查表，
+    # 不再每请求走 os.getcwd()/abspath
+    app.config.setdefault(
+        "DATA_DIR", os.path.abspath(os.path.join(app.root_path, "..", "data"))
+    )
+
+    # 前端页面目录：启动时算一次，处理函数里不再每次 dirname/join/exists
+    app.config["FRONTEND_DIR"] = os.path.join(
+        os.path.dirname(os.path.dirname(__file__)), "frontend"
+    )
+
     # 索引与模型配置：给出稳定默认；支持环境变量覆盖
     default_index_path = os.path.abspath(
         os.environ.get("FAISS_INDEX_PATH")
@@ -64,9 +207,59 @@ def create_app(light: bool = False):
     )
     os.makedirs(os.path.dirname(default_index_path), exist_ok=True)
     app.config["FAISS_INDEX_PATH"] = default_index_path
+    # mmap 打开索引：RSS 只占热页；设 FAISS_MMAP=0 可退回整读
+    app.config.setdefault("FAISS_MMAP", os.environ.get("FAISS_MMAP", "1") == "1")
+    # FAISS_PREWARM=1：索引加载后后台预读 mmap 页（见 _LazyResources._load）
+    app.config.setdefault("FAISS_PREWARM", os.environ.get("FAISS_PREWARM") == "1")
+    # 索引内存储精度：fp16 把索引体积/带宽砍半，CLIP 相似度几乎无损；
+    # 可选 fp32（不量化）/ sq8（4 倍压缩）。faiss API 输入仍是 float32，
+    # 量化发生在索引内部。
+    app.config.setdefault("FAISS_PRECISION", os.environ.get("FAISS_PRECISION", "fp16"))
+    _sq = {"fp32": "Flat", "fp16": "SQfp16", "sq8": "SQ8"}.get(
+        str(app.config["FAISS_PRECISION"]).lower(), "SQfp16"
+    )
+    # 新建索引的 factory 串：默认 IVF1 + 上面的量化（小库仍是穷举，reopen 可 mmap）
+    app.config.setdefault(
+        "FAISS_INDEX_FACTORY", os.environ.get("FAISS_INDEX_FACTORY", f"IVF1,{_sq}")
+    )
+    # IVF 检索时探的桶数；库大了用 /api/maintenance/rebuild_faiss 重建成
+    # nlist≈√N 的真 IVF 后，这个值决定召回/速度折中
+    app.config.setdefault("FAISS_NPROBE", int(os.environ.get("FAISS_NPROBE", "16")))
+    # FAISS_AUTOSAVE=0：add 后不自动（防抖）落盘，落盘时机全由调用方/
+    # 运维脚本掌控；进程退出时的 atexit 兜底仍在
+    app.config.setdefault("FAISS_AUTOSAVE", os.environ.get("FAISS_AUTOSAVE", "1") == "1")
+    # factory 串选 HNSW（如 FAISS_INDEX_FACTORY=HNSW32,Flat）时的候选
+    # 队列长度；IVF/Flat 索引忽略
+    app.config.setdefault("FAISS_EFSEARCH", int(os.environ.get("FAISS_EFSEARCH", "64")))
+
+    # USE_X_ACCEL=1：图片/缩略图下发交给前置 nginx（X-Accel-Redirect + sendfile）
+    app.config.setdefault("USE_X_ACCEL", os.environ.get("USE_X_ACCEL") == "1")
+
+    # USE_X_SENDFILE=1：Apache/mod_xsendfile 等场景。这是 Flask 原生配置键，
+    # send_file 会改发 X-Sendfile 头而不是自己读文件；nginx 用上面的 X_ACCEL
+    app.config.setdefault("USE_X_SENDFILE", os.environ.get("USE_X_SENDFILE") == "1")
+
+    # ANALYTICS_FAST_COUNT=1：Postgres 上 totals.count 用 pg_class.reltuples
+    # 估算值（O(1) 目录查询）代替全表 COUNT(*)；仅影响仪表盘展示
+    app.config.setdefault(
+        "ANALYTICS_FAST_COUNT", os.environ.get("ANALYTICS_FAST_COUNT") == "1"
+    )
+
+    # EMBED_STORE_INT8=1：数据库里的向量 blob 改存 int8 量化值（max-abs
+    # 缩放，体积 1/4），旧 float32 行靠 vector_scale=NULL 区分，可混存
+    app.config.setdefault("EMBED_STORE_INT8", os.environ.get("EMBED_STORE_INT8") == "1")
+
+    # 批量编码的 batch 大小：CLIP 前向的 per-call 开销靠批量摊薄，
+    # 显存紧张时可调小
+    app.config.setdefault("EMBED_BATCH_SIZE", int(os.environ.get("EMBED_BATCH_SIZE", "32")))
+
+    # UPLOAD_ASYNC=1：上传响应只等「落盘 + Image 行」，CLIP/OCR 出队到
+    # 进程内后台线程（见 uploads.py），接口改回 202 + processing 标记
+    app.config.setdefault("UPLOAD_ASYNC", os.environ.get("UPLOAD_ASYNC") == "1")
 
     app.config.setdefault("EMBED_MODEL", os.environ.get("EMBED_MODEL", "clip-ViT-B-32"))
-    app.config.setdefault("EMBED_DEVICE", os.environ.get("EMBED_DEVICE", "cpu"))
+    # 'auto' 在模型加载时按 CUDA→MPS→CPU 探测（探测放在 vec.py，避免这里 import torch）
+    app.config.setdefault("EMBED_DEVICE", os.environ.get("EMBED_DEVICE", "auto"))
 
     db.init_app(app)
     jwt.init_app(app)
@@ -76,26 +269,7 @@ def create_app(light: bool = False):
             "rules": sorted([f"{r.rule}  [{','.join(r.methods)}] → {r.endpoint}"
                             for r in app.url_map.iter_rules()])
         }
-    with app.app_context():
-        from . import models
-        db.create_all()
-
-        # 此处再引入日志工具（现在引入不再形成环）
-        from .logging_utils import configure_file_logging, record_audit
-        configure_file_logging(app)
-
-        # 注册你的蓝图（示例）
-        from .api.images import bp as images_bp
-        app.register_blueprint(images_bp)
-
-        @app.errorhandler(Exception)
-        def _handle_err(e):
-            app.logger.exception("Unhandled")
-            try:
-                record_audit("error", level="ERROR", status="500", message=str(e))
-            except Exception:
-                pass
-            return jsonify({"error": "internal_error"}), 500
+    configure_file_logging(app)
 
     @app.before_request
     def _start_timer():
@@ -118,7 +292,12 @@ def create_app(light: bool = False):
             pass
         return resp
     # ---------- Blueprint autoload ----------
-    def _maybe_register(dotted: str):
+    # 蓝图一律在启动时注册：URL 匹配发生在请求上下文 push 的那一刻，
+    # 请求钩子里再补注册已经赶不上本次匹配（首个请求必 404），而且
+    # 并发改 url_map 也不安全。真正贵的 torch/FAISS 初始化仍然是懒的
+    # （_LazyResources：首个检索请求才加载）；蓝图模块顶层只有
+    # numpy/PIL 这类轻量导入，启动时付一次没有感知。
+    def _import_and_register(dotted: str):
         try:
             mod = import_module(dotted)
             bp = getattr(mod, "bp", None)
@@ -133,175 +312,231 @@ def create_app(light: bool = False):
         except Exception as e:
             app.logger.warning(f"[blueprint] skip {dotted}: {e}")
 
-    _maybe_register("app.auth")
-    _maybe_register("app.api.uploads")
-    _maybe_register("app.api.images")
-    _maybe_register("app.api.search")
-    _maybe_register("app.api.analytics")
-    _maybe_register("app.api.maintenance")
+    for _dotted in (
+        "app.auth",
+        "app.api.uploads",
+        "app.api.images",
+        "app.api.search",
+        "app.api.analytics",
+        "app.api.maintenance",
+    ):
+        _import_and_register(_dotted)
 
     # ---------- Simple pages ----------
+    # /health 被 LB 每秒轮询：body 预编成 bytes，绕开 jsonify 的 dict→JSON 序列化
+    _health_body = b'{"ok":true}\n'
+
     @app.get("/health")
     def health():
-        return jsonify(ok=True)
+        return app.response_class(
+            _health_body, mimetype="application/json",
+            headers={"Cache-Control": "no-store"},
+        )
 
+    # send_from_directory 自带 404/ETag/304，处理函数只剩一次字典查找
     @app.get("/analytics")
     def analytics_page():
-        root = os.path.dirname(os.path.dirname(__file__))  # project root
-        html_path = os.path.join(root, "frontend", "analytics.html")
-        if not os.path.exists(html_path):
-            return "analytics.html not found. Please create frontend/analytics.html", 404
-        return send_file(html_path)
+        return send_from_directory(app.config["FRONTEND_DIR"], "analytics.html", max_age=300)
 
     @app.get("/gallery")
     def gallery_page():
-        root = os.path.dirname(os.path.dirname(__file__))  # project root
-        path = os.path.join(root, "frontend", "gallery.html")
-        if not os.path.exists(path):
-            return "gallery.html not found. Please create frontend/gallery.html", 404
-        return send_file(path)
-        
+        return send_from_directory(app.config["FRONTEND_DIR"], "gallery.html", max_age=300)
+
     @app.get("/login")
     def login_page():
-        """
-        返回前端登录页面 HTML。
-        约定文件放在项目根目录的 frontend/login.html。
-        """
-        root = os.path.dirname(os.path.dirname(__file__))  # project root
-        path = os.path.join(root, "frontend", "login.html")
-        if not os.path.exists(path):
-            return "login.html not found. Please create frontend/login.html", 404
-        return send_file(path)
+        """返回前端登录页面 HTML（约定放在项目根目录 frontend/login.html）。"""
+        return send_from_directory(app.config["FRONTEND_DIR"], "login.html", max_age=300)
         
     # ---------- Heavy components (Vec + FAISS) ----------
     with app.app_context():
-        # 1) 业务库表（图片/embedding/ocr/audit 等）
-        from . import models  # noqa: F401
-        db.create_all()
-
-        # 2) 用户库表（User 等，位于 models_user.py，并在模型里 __bind_key__="auth"）
-        try:
-            from . import models_user  # noqa: F401
-            # 你的 SQLAlchemy 版本使用 bind_key 关键字
-            db.create_all(bind_key="auth")
-        except Exception as e:
-            app.logger.warning(f"[auth db] create_all(bind_key='auth') failed: {e}")
-
-        # 是否跳过大组件（轻量模式）
-        env_light = os.environ.get("LIGHT_MODE") == "1"
-        if not (light or env_light):
-            # 向量模型
-            from .vec import VecModel
-            vec_model = VecModel(app.config["EMBED_MODEL"], app.config["EMBED_DEVICE"])
+        # SQLite 调优：WAL（读不阻塞写）+ synchronous=NORMAL（commit 少一次 fsync），
+        # 外加内存临时表和 256MB mmap；对 image_drive.db 和 auth.db 两个引擎都生效
+        from sqlalchemy import event
 
-            # 尺寸兜底
+        def _sqlite_pragmas(dbapi_con, _record):
+            cur = dbapi_con.cursor()
             try:
-                embed_dim = getattr(vec_model, "dim", None)
-                if not embed_dim:
-                    from .services import embeddings as EMB
-                    embed_dim = getattr(EMB, "DIM", None)
-                embed_dim = int(embed_dim or 512)
-            except Exception:
-                embed_dim = 512
-
-            # FAISS store
-            from .faiss_store import FaissStore
-            faiss_store = FaissStore(dim=embed_dim, index_path=app.config["FAISS_INDEX_PATH"])
-
-            # 宽容加载：有 load() 就调；否则交由后续脚本/首次写入时处理
+                cur.execute("PRAGMA journal_mode=WAL")
+                cur.execute("PRAGMA synchronous=NORMAL")
+                cur.execute("PRAGMA temp_store=MEMORY")
+                cur.execute("PRAGMA mmap_size=268435456")
+            finally:
+                cur.close()
+
+        for _engine in set(db.engines.values()):
+            if _engine.url.drivername.startswith("sqlite"):
+                event.listen(_engine, "connect", _sqlite_pragmas)
+
+        # 建表只在首次启动做一次：marker 存在就跳过 create_all 的
+        # sqlite_master 往返（改了 schema 就删掉 instance/.schema_initialized 重建）
+        schema_marker = os.path.join(app.instance_path, ".schema_initialized")
+        if not os.path.exists(schema_marker):
+            # 1) 业务库表（图片/embedding/ocr/audit 等）
+            from . import models  # noqa: F401
+            db.create_all()
+
+            # 2) 用户库表（User 等，位于 models_user.py，并在模型里 __bind_key__="auth"）
+            _schema_ok = True
             try:
-                if hasattr(faiss_store, "load"):
-                    faiss_store.load()  # 不传参，避免签名不匹配
-                    app.logger.info(
-                        "[faiss] index loaded (path=%s, dim=%s, ntotal=%s)",
-                        app.config["FAISS_INDEX_PATH"],
-                        getattr(faiss_store, "dim", None),
-                        getattr(faiss_store, "ntotal", None),
-                    )
-                else:
-                    app.logger.warning("[faiss] FaissStore has no load(); skip explicit load")
+                from . import models_user  # noqa: F401
+                # 你的 SQLAlchemy 版本使用 bind_key 关键字
+                db.create_all(bind_key="auth")
+            except Exception as e:
+                _schema_ok = False
+                app.logger.warning(f"[auth db] create_all(bind_key='auth') failed: {e}")
+
+            # 建表没全部成功就不落 marker，下次启动还会重试
+            if _schema_ok:
+                try:
+                    with open(schema_marker, "w"):
+                        pass
+                except Exception as e:
+                    app.logger.warning(f"[schema] cannot write marker {schema_marker}: {e}")
+
+        # 轻量 schema 迁移：create_all 只建新表、从不 ALTER 旧表，而仓库自带的
+        # instance/image_drive.db 建于加列之前；上面的 marker 又会让稳态启动
+        # 连 create_all 都跳过。按 tools/migrate_add_category.py 的
+        # PRAGMA table_info + ALTER TABLE 套路在这里幂等补列，每次启动跑一遍也便宜。
+        if db.engine.url.drivername.startswith("sqlite"):
+            try:
+                from sqlalchemy import text as _text
+
+                def _has_column(conn, table: str, col: str) -> bool:
+                    rows = conn.execute(_text(f"PRAGMA table_info({table})"))
+                    return any(r[1].lower() == col for r in rows)
+
+                with db.engine.begin() as _conn:
+                    if not _has_column(_conn, "image", "megapixels"):
+                        _conn.execute(_text(
+                            "ALTER TABLE image ADD COLUMN megapixels INTEGER"))
+                        _conn.execute(_text(
+                            "CREATE INDEX IF NOT EXISTS ix_image_megapixels "
+                            "ON image (megapixels)"))
+                        app.logger.info("[schema] added image.megapixels")
+                    # int8 量化标尺列（NULL = 旧的 float32 行，见 Embedding.vector()）
+                    if not _has_column(_conn, "embedding", "vector_scale"):
+                        _conn.execute(_text(
+                            "ALTER TABLE embedding ADD COLUMN vector_scale FLOAT"))
+                        app.logger.info("[schema] added embedding.vector_scale")
             except Exception as e:
-                app.logger.warning("[faiss] failed to load index (%s); you can rebuild later", e)
+                app.logger.warning(f"[schema migrate] skipped: {e}")
 
-            app.extensions["vec_model"] = vec_model
-            app.extensions["faiss_store"] = faiss_store
+        # OCR 全文索引（SQLite FTS5）：MATCH 走倒排索引，代替 search_ocr
+        # 里 %q% ILIKE 的全表扫；触发器保持与 ocr_text 同步。
+        # DDL 全部 IF NOT EXISTS，幂等，每次启动跑一遍也便宜。
+        if db.engine.url.drivername.startswith("sqlite"):
+            try:
+                from sqlalchemy import text as _text
+                with db.engine.begin() as _conn:
+                    # 先记下建表前 FTS 表是否已存在：外部 content 表上的
+                    # count(*) 读的是 ocr_text 本体，看不出索引本身是否为空
+                    _fts_existed = bool(_conn.execute(_text(
+                        "SELECT 1 FROM sqlite_master "
+                        "WHERE type='table' AND name='ocr_text_fts'")).scalar())
+                    _conn.execute(_text(
+                        "CREATE VIRTUAL TABLE IF NOT EXISTS ocr_text_fts "
+                        "USING fts5(text, content='ocr_text', content_rowid='image_id')"
+                    ))
+                    _conn.execute(_text(
+                        "CREATE TRIGGER IF NOT EXISTS ocr_fts_ai AFTER INSERT ON ocr_text BEGIN "
+                        "INSERT INTO ocr_text_fts(rowid, text) VALUES (new.image_id, new.text); END"
+                    ))
+                    _conn.execute(_text(
+                        "CREATE TRIGGER IF NOT EXISTS ocr_fts_ad AFTER DELETE ON ocr_text BEGIN "
+                        "INSERT INTO ocr_text_fts(ocr_text_fts, rowid, text) "
+                        "VALUES ('delete', old.image_id, old.text); END"
+                    ))
+                    _conn.execute(_text(
+                        "CREATE TRIGGER IF NOT EXISTS ocr_fts_au AFTER UPDATE ON ocr_text BEGIN "
+                        "INSERT INTO ocr_text_fts(ocr_text_fts, rowid, text) "
+                        "VALUES ('delete', old.image_id, old.text); "
+                        "INSERT INTO ocr_text_fts(rowid, text) VALUES (new.image_id, new.text); END"
+                    ))
+                    # 首次建表、或真实索引仍为空时把存量行灌进索引（之后由
+                    # 触发器维护）。索引行数要探 ocr_text_fts_docsize 影子表；
+                    # 直接 count(*) FTS 表会被转发到 content 表 ocr_text 上
+                    _n_idx = 0 if not _fts_existed else _conn.execute(_text(
+                        "SELECT count(*) FROM ocr_text_fts_docsize")).scalar()
+                    _n_src = _conn.execute(_text(
+                        "SELECT count(*) FROM ocr_text")).scalar()
+                    if _n_src and not _n_idx:
+                        _conn.execute(_text(
+                            "INSERT INTO ocr_text_fts(ocr_text_fts) VALUES('rebuild')"))
+                app.config.setdefault("OCR_FTS_READY", True)
+            except Exception as e:
+                # 老的 SQLite 编译没带 FTS5 等情况：search_ocr 继续用 ILIKE
+                app.logger.warning(f"[ocr fts] setup skipped: {e}")
+                app.config.setdefault("OCR_FTS_READY", False)
+        elif db.engine.url.drivername.startswith("postgresql"):
+            # Postgres 没有 FTS5，但 pg_trgm 的 GIN 索引能直接加速
+            # ILIKE '%q%'（Seq Scan → Bitmap Index Scan），search_ocr 的
+            # 兜底查询原样受益，不用改路由。DDL 幂等，失败只降级不报错。
+            try:
+                from sqlalchemy import text as _text
+                with db.engine.begin() as _conn:
+                    _conn.execute(_text("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
+                    _conn.execute(_text(
+                        "CREATE INDEX IF NOT EXISTS ocrtext_text_trgm "
+                        "ON ocr_text USING gin (text gin_trgm_ops)"
+                    ))
+            except Exception as e:
+                # 没有建扩展的权限等情况：ILIKE 继续全表扫
+                app.logger.warning(f"[ocr trgm] setup skipped: {e}")
+            app.config.setdefault("OCR_FTS_READY", False)
         else:
-            app.extensions["vec_model"] = None
-            app.extensions["faiss_store"] = None
-
-    # app/__init__.py （在 home() 下面追加一个页面映射）
-    """@app.get("/image/<int:image_id>")
-    def image_detail(image_id: int):
-        # 直接返回静态文件，页面内用 JS 从 URL 里解析 id 去调 API
-        return current_app.send_static_file("image.html")"""
-    """@app.route("/api/images/<int:id>/view")
-    def view_image(id):
-        img = Image.query.get(id)
-        if not img:
-            return jsonify({"error": "not found"}), 404
-
-        # 统一路径分隔符（Windows → /）
-        real_path = img.path.replace("\\", "/")
-
-        # 确认文件存在
-        if not os.path.exists(real_path):
-            return jsonify({"error": "file not found", "path": real_path}), 404
-
-        return send_file(real_path)"""
-    @app.get("/api/images/<int:image_id>/view")
-    def view_image(image_id: int):
-        img = Image.query.get_or_404(image_id)
-        path = _resolve_image_path(img)
-        if not path:
-            return jsonify({"error": "file_not_found",
-                            "id": image_id,
-                            "db_path": img.path,
-                            "try": _image_path_from_sha(img.sha256)}), 404
-        return send_file(path, mimetype=img.mime or "image/jpeg")
-
-    
-    from flask import send_from_directory
+            app.config.setdefault("OCR_FTS_READY", False)
 
-    @app.route("/image/<int:image_id>")
-    def serve_image_page(image_id):
-        return send_from_directory("static", "image.html")
-    
+        # 是否跳过大组件（轻量模式）；否则也只登记懒加载器，首个检索请求再真正加载
+        env_light = os.environ.get("LIGHT_MODE") == "1"
+        app.extensions["lazy_resources"] = _LazyResources(app, light=(light or env_light))
+        app.extensions["vec_model"] = None
+        app.extensions["faiss_store"] = None
+
+    # /api/images/<id>/view 与 /thumb 由 images 蓝图提供（app/api/images.py），
+    # 这里不再保留重复实现。
 
     @app.route("/image/<int:image_id>")
     def image_detail(image_id):
-        """Render the HTML detail page for one image"""
-        image = Image.query.get(image_id)
-        if not image:
-            return render_template("404.html"), 404
-        return render_template("image.html", image=image)
-
-    @app.get("/api/images/<int:image_id>/thumb")
-    def view_thumb(image_id: int):
-        img = Image.query.get_or_404(image_id)
-        tpath = _resolve_thumb_path(img)
-        if not tpath:
-            return jsonify({"error": "thumb_not_found",
-                            "id": image_id,
-                            "try": _thumb_path_from_sha(img.sha256)}), 404
-        return send_file(tpath, mimetype="image/jpeg")
+        """图片详情页：静态壳页面，内部 JS 从 URL 解析 id 再调 API。"""
+        return send_from_directory(app.static_folder, "image.html")
 
     @app.get("/_repair_paths")
     def repair_paths():
-        fixed = missing = 0
-        for img in Image.query:   # 大量时可分页
-            p = _resolve_image_path(img)
-            if p: fixed += 1
-            else: missing += 1
-        db.session.commit()
-        return jsonify({"fixed": fixed, "missing": missing})
-
-    # ----- Static home -----
+        import json
+        from sqlalchemy import select
+        from flask import Response, stream_with_context
+        from .models import Image
+        from .api.images import _resolve_image_path
+        from .paths import clear_path_caches
+
+        # yield_per 流式取行 + 分批 commit：峰值内存 O(批) 而不是 O(全表)
+        def _gen():
+            clear_path_caches()  # 修复前先丢掉可能过期的 exists 缓存
+            fixed = missing = 0
+            stream = db.session.execute(
+                select(Image).execution_options(yield_per=1000)
+            ).scalars()
+            for i, img in enumerate(stream, 1):
+                if _resolve_image_path(img):
+                    fixed += 1
+                else:
+                    missing += 1
+                if i % 1000 == 0:
+                    db.session.commit()
+                    yield json.dumps({"progress": i, "fixed": fixed, "missing": missing}) + "\n"
+            db.session.commit()
+            yield json.dumps({"done": True, "fixed": fixed, "missing": missing}) + "\n"
+
+        return Response(stream_with_context(_gen()), mimetype="application/x-ndjson")
+
     # ---------- Static home ----------
     @app.get("/")
     def home():
-        return current_app.send_static_file("index.html")
-    
-    from flask import request
+        # SPA 壳页面：max_age + conditional 让稳态流量走 304（零 body）
+        resp = send_from_directory(app.static_folder, "index.html",
+                                   max_age=3600, conditional=True)
+        resp.headers["Cache-Control"] = "public, max-age=3600"
+        return resp
 
     @app.after_request
     def _audit_non2xx(resp):
@@ -314,20 +549,8 @@ def create_app(light: bool = False):
         except Exception:
             pass
         return resp
-    
-    # —— 启用文件日志（轮转） ——
-    #configure_file_logging(app)
-    #from werkzeug.exceptions import HTTPException
+
     # —— 统一错误捕获：写入 error.log + 审计轨迹 ——
-    #@app.errorhandler(Exception)
-    #def _handle_err(e):
-        # 关键：HTTPException（含 404）直接原样返回，别转成 500
-     #   if isinstance(e, HTTPException):
-      #      return e
-
-        # 只有非 HTTPException 的“真异常”才记 500
-       # current_app.logger.exception("Unhandled error")
-        #return jsonify({"error": "internal_error", "message": str(e)}), 500
     @app.errorhandler(Exception)
     def _handle_err(e):
         rid = getattr(g, "rid", "-")
@@ -1,19 +1,40 @@
 # app/api/analytics.py
 from __future__ import annotations
 
+import copy
 import csv
-import io
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta, timezone
+from functools import lru_cache
 from typing import Dict, List, Tuple
 
-from flask import Blueprint, request, jsonify, Response
-from sqlalchemy import func, select, and_
+import numpy as np
+from flask import Blueprint, current_app, request, jsonify, Response, stream_with_context
+from sqlalchemy import func, select, and_, case, event, text
 
 from .. import db
 from ..models import Image
 
 bp = Blueprint("analytics", __name__, url_prefix="/api/analytics")
 
+# Image 表的进程内“版本号”：增删改时 +1，作为 summary 缓存 key 的一部分，
+# 让仪表盘轮询在表没变时直接吃缓存
+_IMAGE_VERSION = 0
+
+
+def invalidate_summary_cache() -> None:
+    """手动失效 summary 缓存：绕过 ORM 的 Core DELETE/UPDATE 不触发下面的
+    mapper 事件（如 images.py 的 delete_image），改表后需要显式调一次。"""
+    global _IMAGE_VERSION
+    _IMAGE_VERSION += 1
+
+
+@event.listens_for(Image, "after_insert")
+@event.listens_for(Image, "after_update")
+@event.listens_for(Image, "after_delete")
+def _bump_image_version(mapper, connection, target):
+    invalidate_summary_cache()
+
 
 # ----------------------------- helpers ---------------------------------
 def _parse_int(qname: str, default: int) -> int:
@@ -56,14 +77,60 @@ def _iso_year_week(d: datetime) -> Tuple[int, int]:
 def category_breakdown():
     """
     返回 [{category, count}]；与前端 Gallery 的筛选联动。
+    可选 ?samples=N（1..32）：每类再带 N 个最新 image id 作为 sample_ids。
+    计数和样本走同一条窗口查询（row_number + count OVER PARTITION BY），
+    避免“每个分类再发一条 LIMIT N 查询”的 N+1。
     """
-    q = db.session.query(Image.category, func.count(Image.id)) \
-        .group_by(Image.category) \
-        .order_by(func.count(Image.id).desc())
-    rows = [{"category": c or "uncategorized", "count": int(n or 0)} for c, n in q.all()]
+    samples = max(0, min(32, _parse_int("samples", 0)))
+    if not samples:
+        q = db.session.query(Image.category, func.count(Image.id)) \
+            .group_by(Image.category) \
+            .order_by(func.count(Image.id).desc())
+        rows = [{"category": c or "uncategorized", "count": int(n or 0)} for c, n in q.all()]
+        return jsonify(rows)
+
+    rn = func.row_number().over(
+        partition_by=Image.category, order_by=Image.id.desc()).label("rn")
+    total = func.count().over(partition_by=Image.category).label("total")
+    sub = select(Image.id, Image.category, rn, total).subquery()
+    win_rows = db.session.execute(
+        select(sub.c.category, sub.c.id, sub.c.total).where(sub.c.rn <= samples)
+    ).all()
+
+    by_cat: Dict[str, Dict] = {}
+    for cat, iid, n in win_rows:
+        key = cat or "uncategorized"
+        entry = by_cat.setdefault(key, {"category": key, "count": int(n or 0), "sample_ids": []})
+        entry["sample_ids"].append(int(iid))
+    rows = sorted(by_cat.values(), key=lambda r: (-r["count"], r["category"]))
     return jsonify(rows)
 
 
+def _size_percentiles(eng) -> Dict[str, float]:
+    """
+    size_bytes 的 p50/p90/p99（KB）。用 np.fromiter 直接灌进 int64 数组，
+    np.quantile(method='nearest') 是 C 向量化的单遍 introselect，
+    不走 Python float 对象排序。
+    拿 engine 而不是 session：可能在工作线程里跑（见 _compute_summary）。
+    """
+    # yield_per：分批流回，不先在 Python 堆里攒出整列的 tuple 列表
+    with eng.connect() as conn:
+        it = conn.execute(
+            select(Image.size_bytes)
+            .where(Image.size_bytes.isnot(None))
+            .execution_options(yield_per=10_000)
+        ).scalars()
+        arr = np.fromiter(it, dtype=np.int64)
+    if arr.size == 0:
+        return {"p50_kb": 0.0, "p90_kb": 0.0, "p99_kb": 0.0}
+    p50, p90, p99 = np.quantile(arr, [0.5, 0.9, 0.99], method="nearest")
+    return {
+        "p50_kb": round(float(p50) / 1024.0, 1),
+        "p90_kb": round(float(p90) / 1024.0, 1),
+        "p99_kb": round(float(p99) / 1024.0, 1),
+    }
+
+
 # ---- Summary core ------------------------------------------------------
 
 def _compute_summary(days: int, tz_offset_min: int, compact_weeks: bool, with_cum: bool) -> Dict:
@@ -75,52 +142,77 @@ def _compute_summary(days: int, tz_offset_min: int, compact_weeks: bool, with_cu
       - size_bins/mp_bins/mime/category
     注意：所有日期粒度都以“本地时间偏移”为准（仅用于分桶显示）。
     """
-    # --- totals ---
-    total_count = db.session.query(func.count(Image.id)).scalar() or 0
-    first_dt_utc = db.session.query(func.min(Image.created_at)).scalar()
-    last_dt_utc = db.session.query(func.max(Image.created_at)).scalar()
+    # --- totals --- 三个聚合并成一条 SELECT，少两次 DB 往返
+    # Postgres + ANALYTICS_FAST_COUNT=1 时 count 走 reltuples 估算（免全表扫）
+    count_is_estimate = False
+    est_count = None
+    if (current_app.config.get("ANALYTICS_FAST_COUNT")
+            and db.engine.dialect.name == "postgresql"):
+        try:
+            est_count = db.session.execute(text(
+                "SELECT reltuples::bigint FROM pg_class WHERE relname='image'"
+            )).scalar()
+        except Exception:
+            est_count = None
+    if est_count is not None and est_count >= 0:
+        count_is_estimate = True
+        total_count = int(est_count)
+        first_dt_utc, last_dt_utc = db.session.execute(
+            select(func.min(Image.created_at), func.max(Image.created_at))
+        ).one()
+    else:
+        total_count, first_dt_utc, last_dt_utc = db.session.execute(
+            select(func.count(Image.id), func.min(Image.created_at), func.max(Image.created_at))
+        ).one()
+    total_count = total_count or 0
 
     # time window：过去 N 天，右开区间今日不含（仅用于“展示范围起点”）
     now_utc = datetime.utcnow().replace(tzinfo=timezone.utc)
     start_local = _localize_dt(now_utc, tz_offset_min) - timedelta(days=days)
     bucket_days = _daterange(start_local.replace(hour=0, minute=0, second=0, microsecond=0), days)
+    # 每个桶日的展示 key 只格式化一次；这张表同时就是窗口过滤器——
+    # 不在窗口里的日期查不到 key，自然被丢掉
+    key_map = {d.date(): _fmt_date_dmy(d) for d in bucket_days}
 
-    # 将窗口内的 created_at 拉到 Python，用“本地日期”计数
+    # 按天分桶下推到 SQL：一次 GROUP BY 扫描，传回的行数从 N 降到 ≤days
     begin_utc = (start_local - timedelta(minutes=tz_offset_min)).replace(tzinfo=timezone.utc)
+    if db.engine.dialect.name == "sqlite":
+        bucket = func.date(func.datetime(Image.created_at, f"{int(tz_offset_min)} minutes"))
+    else:
+        bucket = func.date(Image.created_at + timedelta(minutes=tz_offset_min))
     rows = db.session.execute(
-        select(Image.created_at)
+        select(bucket, func.count())
         .where(Image.created_at.isnot(None))
         .where(Image.created_at >= begin_utc - timedelta(days=1))
+        .group_by(bucket)
     ).all()
 
     day_counter: Dict[str, int] = {}
-    for (created_at_utc,) in rows:
-        if not created_at_utc:
+    for bucket_date, cnt in rows:
+        if not bucket_date:
             continue
-        d_local = _localize_dt(created_at_utc, tz_offset_min)
-        if d_local.date() < start_local.date():
+        # fromisoformat 是 C 实现，比 strptime 快一个量级（虽然这里最多 days 行）
+        d_local = datetime.fromisoformat(str(bucket_date))
+        key = key_map.get(d_local.date())
+        if key is None:
             continue
-        key = _fmt_date_dmy(d_local)
-        day_counter[key] = day_counter.get(key, 0) + 1
+        day_counter[key] = int(cnt)
 
-    # by_day：填满窗口；可选累计
+    # by_day + by_week 一趟循环搞定：每个桶日只格式化/查表一次，
+    # ISO 周计数顺手累加（窗口本身有序，周 key 仍需排序兜底跨年）
     by_day = []
+    week_counter: Dict[str, int] = {}
     running = 0
-    for d in bucket_days:
-        k = _fmt_date_dmy(d)
+    for d, k in zip(bucket_days, key_map.values()):
         c = int(day_counter.get(k, 0))
         running += c
         if with_cum:
             by_day.append({"date": k, "count": c, "cum": running})
         else:
             by_day.append({"date": k, "count": c})
-
-    # by_week：用“本地日期”的 ISO 周聚合
-    week_counter: Dict[str, int] = {}
-    for d in bucket_days:
         y, w = _iso_year_week(d)
         wk = f"{y}-W{w:02d}"
-        week_counter[wk] = week_counter.get(wk, 0) + int(day_counter.get(_fmt_date_dmy(d), 0))
+        week_counter[wk] = week_counter.get(wk, 0) + c
     by_week_all = [{"week": k, "count": int(v)} for k, v in sorted(week_counter.items())]
     by_week = by_week_all if not compact_weeks else [r for r in by_week_all if r["count"] > 0]
 
@@ -134,13 +226,10 @@ def _compute_summary(days: int, tz_offset_min: int, compact_weeks: bool, with_cu
         ("5–10MB", and_(sb >= 5_242_880, sb < 10_485_760)),
         ("≥10MB", sb >= 10_485_760),
     ]
-    size_rows = []
-    for label, flt in size_filters:
-        cnt = db.session.query(func.count(Image.id)).filter(flt).scalar() or 0
-        size_rows.append({"bin": label, "count": int(cnt)})
-
-    # megapixels bins —— width/height 可能为 NULL，coalesce 成 0
-    mp = func.coalesce(Image.width, 0) * func.coalesce(Image.height, 0)
+    # megapixels bins —— 优先用写入时算好的 megapixels 列（有索引）；
+    # 旧行没回填时退回 width*height 表达式
+    mp = func.coalesce(Image.megapixels,
+                       func.coalesce(Image.width, 0) * func.coalesce(Image.height, 0))
     mp_filters = [
         ("<0.5MP", mp < 500_000),
         ("0.5–1MP", and_(mp >= 500_000, mp < 1_000_000)),
@@ -149,29 +238,58 @@ def _compute_summary(days: int, tz_offset_min: int, compact_weeks: bool, with_cu
         ("4–8MP", and_(mp >= 4_000_000, mp < 8_000_000)),
         ("≥8MP", mp >= 8_000_000),
     ]
-    mp_rows = []
-    for label, flt in mp_filters:
-        cnt = db.session.query(func.count(Image.id)).filter(flt).scalar() or 0
-        mp_rows.append({"bin": label, "count": int(cnt)})
+
+    # 12 个计数用一次扫描的 SUM(CASE) 算完，而不是 12 次 COUNT(*) 往返
+    bin_cols = [
+        func.sum(case((flt, 1), else_=0))
+        for _, flt in (*size_filters, *mp_filters)
+    ]
+
+    # bins/mime/category/percentiles 四块互不依赖：丢进线程池并行跑，
+    # 每个线程用自己的 engine.connect()（不共享 session），DB 等待时间重叠
+    eng = db.engine
+
+    def _fetch(stmt):
+        with eng.connect() as conn:
+            return conn.execute(stmt).all()
+
+    with ThreadPoolExecutor(max_workers=4) as ex:
+        f_bins = ex.submit(_fetch, select(*bin_cols).select_from(Image))
+        f_mime = ex.submit(
+            _fetch, select(Image.mime, func.count(Image.id)).group_by(Image.mime))
+        f_cat = ex.submit(
+            _fetch, select(Image.category, func.count(Image.id)).group_by(Image.category))
+        f_pct = ex.submit(_size_percentiles, eng)
+        bin_counts = f_bins.result()[0]
+        mime_pairs = f_mime.result()
+        cat_pairs = f_cat.result()
+        size_pcts = f_pct.result()
+
+    size_rows = [
+        {"bin": label, "count": int(bin_counts[i] or 0)}
+        for i, (label, _) in enumerate(size_filters)
+    ]
+    mp_rows = [
+        {"bin": label, "count": int(bin_counts[len(size_filters) + i] or 0)}
+        for i, (label, _) in enumerate(mp_filters)
+    ]
 
     # mime
-    mime_rows = []
-    for m, n in db.session.query(Image.mime, func.count(Image.id)).group_by(Image.mime).all():
-        mime_rows.append({"mime": m or "unknown", "count": int(n or 0)})
+    mime_rows = [{"mime": m or "unknown", "count": int(n or 0)} for m, n in mime_pairs]
     mime_rows.sort(key=lambda r: (-r["count"], r["mime"]))
 
     # category
-    cat_rows = []
-    for c, n in db.session.query(Image.category, func.count(Image.id)).group_by(Image.category).all():
-        cat_rows.append({"category": c or "uncategorized", "count": int(n or 0)})
+    cat_rows = [{"category": c or "uncategorized", "count": int(n or 0)} for c, n in cat_pairs]
     cat_rows.sort(key=lambda r: (-r["count"], r["category"]))
 
     totals = {
         "count": int(total_count),
+        "count_is_estimate": count_is_estimate,
         "first_created_at": (first_dt_utc.isoformat(timespec="seconds") if first_dt_utc else None),
         "last_created_at": (last_dt_utc.isoformat(timespec="seconds") if last_dt_utc else None),
         "window_days": int(days),
         "window_since": _fmt_date_dmy(start_local),
+        "size_percentiles": size_pcts,
     }
 
     return {
@@ -185,6 +303,25 @@ def _compute_summary(days: int, tz_offset_min: int, compact_weeks: bool, with_cu
     }
 
 
+@lru_cache(maxsize=64)
+def _compute_summary_cached(days: int, tz_offset_min: int, compact_weeks: bool,
+                            with_cum: bool, version: int, hour_key: str) -> Dict:
+    return _compute_summary(days=days, tz_offset_min=tz_offset_min,
+                            compact_weeks=compact_weeks, with_cum=with_cum)
+
+
+def _summary(days: int, tz_offset_min: int, compact_weeks: bool, with_cum: bool) -> Dict:
+    """
+    _compute_summary 的缓存入口：key 含表版本号（见 _IMAGE_VERSION）和
+    当前 UTC 小时（时间窗随钟表走，缓存最多滞后一小时）。
+    返回深拷贝，调用方随便改不会污染缓存。
+    """
+    hour_key = datetime.utcnow().strftime("%Y-%m-%d %H")
+    data = _compute_summary_cached(days, tz_offset_min, compact_weeks,
+                                   with_cum, _IMAGE_VERSION, hour_key)
+    return copy.deepcopy(data)
+
+
 @bp.get("/summary")
 def analytics_summary():
     """
@@ -199,73 +336,79 @@ def analytics_summary():
     compact = _as_bool("compact")
     with_cum = _as_bool("with_cum")
 
-    data = _compute_summary(days=days, tz_offset_min=tz_min, compact_weeks=compact, with_cum=with_cum)
+    data = _summary(days, tz_min, compact, with_cum)
     return jsonify(data)
 
 
 # ---- Export ------------------------------------------------------------
 
-def _to_csv_blocks(summary: Dict, with_cum: bool) -> str:
+class _Echo:
+    """csv.writer 的“写哪儿都行”出口：write 直接把行返回给生成器 yield。"""
+
+    def write(self, value: str) -> str:
+        return value
+
+
+def _iter_csv_blocks(summary: Dict, with_cum: bool):
     """
-    将 summary 写成“分节”CSV 文本；with_cum 决定 by_day 是否输出 cum 列。
+    逐行生成“分节”CSV；with_cum 决定 by_day 是否输出 cum 列。
+    不再在 StringIO 里攒整个文件：峰值内存 O(1)，客户端也能边到边收。
     """
-    buf = io.StringIO()
-    w = csv.writer(buf)
+    w = csv.writer(_Echo())
 
     # totals
-    w.writerow(["[totals]"])
-    w.writerow(["key", "value"])
+    yield w.writerow(["[totals]"])
+    yield w.writerow(["key", "value"])
     for k, v in summary["totals"].items():
-        w.writerow([k, v])
-    w.writerow([])
+        yield w.writerow([k, v])
+    yield w.writerow([])
 
-    # by_day
-    w.writerow(["[by_day]"])
+    # by_day —— 最长的一节：整节 join 成一个 chunk 再 yield，
+    # 省掉逐行穿过 generator/WSGI write 的开销（内存仍只有这一节）
+    yield w.writerow(["[by_day]"])
     if with_cum:
-        w.writerow(["date", "count", "cum"])
-        for r in summary["by_day"]:
-            w.writerow([r["date"], r["count"], r.get("cum")])
+        yield w.writerow(["date", "count", "cum"])
+        yield "".join(w.writerow([r["date"], r["count"], r.get("cum")])
+                      for r in summary["by_day"])
     else:
-        w.writerow(["date", "count"])
-        for r in summary["by_day"]:
-            w.writerow([r["date"], r["count"]])
-    w.writerow([])
+        yield w.writerow(["date", "count"])
+        yield "".join(w.writerow([r["date"], r["count"]])
+                      for r in summary["by_day"])
+    yield w.writerow([])
 
     # by_week
-    w.writerow(["[by_week]"])
-    w.writerow(["week", "count"])
+    yield w.writerow(["[by_week]"])
+    yield w.writerow(["week", "count"])
     for r in summary["by_week"]:
-        w.writerow([r["week"], r["count"]])
-    w.writerow([])
+        yield w.writerow([r["week"], r["count"]])
+    yield w.writerow([])
 
     # size_bins
-    w.writerow(["[size_bins]"])
-    w.writerow(["bin", "count"])
+    yield w.writerow(["[size_bins]"])
+    yield w.writerow(["bin", "count"])
     for r in summary["size_bins"]:
-        w.writerow([r["bin"], r["count"]])
-    w.writerow([])
+        yield w.writerow([r["bin"], r["count"]])
+    yield w.writerow([])
 
     # mp_bins
-    w.writerow(["[mp_bins]"])
-    w.writerow(["bin", "count"])
+    yield w.writerow(["[mp_bins]"])
+    yield w.writerow(["bin", "count"])
     for r in summary["mp_bins"]:
-        w.writerow([r["bin"], r["count"]])
-    w.writerow([])
+        yield w.writerow([r["bin"], r["count"]])
+    yield w.writerow([])
 
     # mime
-    w.writerow(["[mime]"])
-    w.writerow(["mime", "count"])
+    yield w.writerow(["[mime]"])
+    yield w.writerow(["mime", "count"])
     for r in summary["mime"]:
-        w.writerow([r["mime"], r["count"]])
-    w.writerow([])
+        yield w.writerow([r["mime"], r["count"]])
+    yield w.writerow([])
 
     # category
-    w.writerow(["[category]"])
-    w.writerow(["category", "count"])
+    yield w.writerow(["[category]"])
+    yield w.writerow(["category", "count"])
     for r in summary["category"]:
-        w.writerow([r["category"], r["count"]])
-
-    return buf.getvalue()
+        yield w.writerow([r["category"], r["count"]])
 
 
 @bp.get("/export")
@@ -286,15 +429,14 @@ def analytics_export():
     compact = _as_bool("compact")
     with_cum = _as_bool("with_cum")
 
-    data = _compute_summary(days=days, tz_offset_min=tz_min, compact_weeks=compact, with_cum=with_cum)
+    data = _summary(days, tz_min, compact, with_cum)
 
     if fmt == "json":
         return jsonify(data)
 
-    csv_text = _to_csv_blocks(data, with_cum=with_cum)
     fn = f"analytics_summary_{days}d.csv"
     return Response(
-        csv_text,
+        stream_with_context(_iter_csv_blocks(data, with_cum=with_cum)),
         mimetype="text/csv; charset=utf-8",
         headers={"Content-Disposition": f'attachment; filename="{fn}"'}
     )
@@ -1,16 +1,67 @@
 # app/api/images.py
 import os
-from flask import Blueprint, jsonify, send_file, abort, request, current_app
+from functools import lru_cache
+from itertools import islice
+
+import numpy as np
+from flask import Blueprint, jsonify, send_file, abort, request, current_app, Response
 from ..models import Image as ImageModel, AuditLog
 from flask_jwt_extended import jwt_required, get_jwt_identity
 #from .. import db
 from ..extensions import db
 from ..models import Image as ImageModel, AuditLog
-from sqlalchemy import or_
-from sqlalchemy.orm import load_only  # 新增：用于一次性取回候选的类别，避免 N 次查询
+from sqlalchemy import or_, func, select, delete, event
+from ..paths import image_path_for_sha, thumb_path_for_sha, path_exists_cached, clear_path_caches
 
 bp = Blueprint("images", __name__)
 
+# ---- list_images 短 TTL 响应缓存 ----
+# 浏览 UI 会用同一组 (category, order, limit, offset/cursor) 反复刷列表；
+# 这里缓存序列化好的 JSON 字节 + ETag，TTL 内直接回放，命中
+# If-None-Match 时 304 零字节。写路径（上传/删除）bump 代数整体失效，
+# 所以最多 5 秒陈旧、且通常立即失效。
+_LIST_CACHE_TTL = 5.0
+_LIST_CACHE_MAX = 1024
+_list_cache: dict[tuple, tuple[float, str, bytes]] = {}
+_list_cache_gen = 0
+
+
+def _bump_list_cache():
+    global _list_cache_gen
+    _list_cache_gen += 1
+    _list_cache.clear()
+
+
+@event.listens_for(ImageModel, "after_insert")
+@event.listens_for(ImageModel, "after_delete")
+def _bump_on_image_write(mapper, connection, target):
+    # ORM 写路径（uploads 等）自动失效；Core DELETE 不走这里，
+    # delete_image 里手动 bump
+    _bump_list_cache()
+
+
+def _cached_list_response(key: tuple):
+    import time as _time
+    hit = _list_cache.get(key)
+    if hit is None or _time.monotonic() - hit[0] >= _LIST_CACHE_TTL:
+        return None
+    _, etag, body = hit
+    if request.if_none_match.contains(etag):
+        return Response(status=304, headers={"ETag": etag})
+    return Response(body, mimetype="application/json", headers={"ETag": etag})
+
+
+def _remember_list_response(key: tuple, resp):
+    import hashlib
+    import time as _time
+    body = resp.get_data()
+    etag = hashlib.md5(body).hexdigest()
+    if len(_list_cache) >= _LIST_CACHE_MAX:
+        _list_cache.clear()
+    _list_cache[key] = (_time.monotonic(), etag, body)
+    resp.set_etag(etag)
+    return resp
+
 def _safe_remove(path: str):
     if path and os.path.exists(path):
         try:
@@ -45,6 +96,16 @@ def list_images():
     limit = min(int(request.args.get("limit", 50)), 200)
     offset = max(int(request.args.get("offset", 0)), 0)
     category = (request.args.get("category") or "").strip()
+    # after_id / cursor_id 是同一个游标参数的两个名字
+    after = request.args.get("after_id", type=int)
+    if after is None:
+        after = request.args.get("cursor_id", type=int)
+    with_total = (request.args.get("with_total") or "0") in ("1", "true", "yes")
+
+    cache_key = (_list_cache_gen, category, order, limit, offset, after, with_total)
+    cached = _cached_list_response(cache_key)
+    if cached is not None:
+        return cached
 
     base = ImageModel.query
 
@@ -54,10 +115,51 @@ def list_images():
         else:
             base = base.filter(ImageModel.category == category)
 
-    total = base.count()
-
-    q = base.order_by(ImageModel.id.asc() if order == "asc" else ImageModel.id.desc())
-    rows = q.offset(offset).limit(limit).all()
+    # keyset 分页（传 after_id 时启用）：WHERE id < 游标 + LIMIT，
+    # 翻多深都是 O(limit)，不像 OFFSET 要把跳过的行重新扫一遍
+    if after is not None:
+        if order == "asc":
+            q = base.filter(ImageModel.id > after).order_by(ImageModel.id.asc())
+        else:
+            q = base.filter(ImageModel.id < after).order_by(ImageModel.id.desc())
+        # 多取 1 行探测是否还有下一页：len(rows)==limit 的判定在“刚好
+        # 整页收尾”时会误报，一次 O(1) 的多取一行比任何 COUNT 都便宜
+        rows = q.limit(limit + 1).all()
+        has_more = len(rows) > limit
+        rows = rows[:limit]
+        items = [{
+            "id": i.id,
+            "sha256": i.sha256,
+            "width": i.width,
+            "height": i.height,
+            "thumb": i.thumb_path,
+            "mime": i.mime,
+            "size_bytes": i.size_bytes,
+            "category": i.category or ""
+        } for i in rows]
+        next_cursor = rows[-1].id if has_more else None
+        payload = {"items": items, "has_more": has_more, "next_cursor": next_cursor}
+        # 游标分页默认不数总数（数总数就是一次全集扫描）；
+        # 显式 with_total=1 时用不带 ORDER BY 的裸 COUNT，可走 index-only
+        if with_total:
+            payload["total"] = base.with_entities(func.count(ImageModel.id)).scalar()
+        return _remember_list_response(cache_key, jsonify(**payload))
+
+    # ---- 老的 offset 路径（前端 Gallery 仍在用，保持响应形状不变）----
+    # 总数用窗口列 count(*) OVER () 随分页行一起带回：原来的
+    # base.count() + 分页查询两次扫描合成一次往返
+    q = (base.add_columns(func.count().over().label("total"))
+             .order_by(ImageModel.id.asc() if order == "asc" else ImageModel.id.desc()))
+    rows_with_total = q.offset(offset).limit(limit).all()
+
+    if rows_with_total:
+        total = int(rows_with_total[0][1])
+        rows = [r[0] for r in rows_with_total]
+    else:
+        # offset 翻过了头（或真没数据）时窗口列拿不到，退回一次平铺 COUNT
+        # （不用 Query.count()——那会包子查询，走不了 index-only scan）
+        total = base.with_entities(func.count(ImageModel.id)).order_by(None).scalar()
+        rows = []
 
     items = [{
         "id": i.id,
@@ -70,7 +172,7 @@ def list_images():
         "category": i.category or ""
     } for i in rows]
 
-    return jsonify(items=items, total=total)
+    return _remember_list_response(cache_key, jsonify(items=items, total=total))
 
 @bp.get("/api/images/<int:image_id>")
 @jwt_required(optional=True)
@@ -122,7 +224,7 @@ def view_image(image_id):
     mime = (getattr(i, "mime", None)
             or mimetypes.guess_type(path)[0]
             or "image/jpeg")
-    return send_file(path, mimetype=mime, as_attachment=False, conditional=True)
+    return _send_image_file(path, mime)
 
 @bp.get("/api/images/<int:image_id>/thumb")
 @jwt_required(optional=True)
@@ -132,7 +234,7 @@ def view_thumb(image_id):
     if not path:
         abort(404)
     # 缩略图统一按 jpeg 下发
-    return send_file(path, mimetype="image/jpeg", as_attachment=False, conditional=True)
+    return _send_image_file(path, "image/jpeg")
 
 #临时更改
 """@bp.get("/api/images/<int:image_id>/download")
@@ -148,69 +250,222 @@ def download(image_id):
     if not os.path.exists(i.path):
         abort(404)
     return send_file(i.path, as_attachment=True)"""
-import os, mimetypes
+import os, mimetypes, traceback
 from flask import current_app, send_file, abort
+from PIL import Image as PILImage
+
+try:
+    import pyvips  # 可选：libvips 流式缩略图，比 Pillow 快数倍且省内存
+except Exception:
+    pyvips = None
 # -------- 路径与缩略图 “自愈” 辅助 --------
 def _norm(p: str) -> str:
     return p.replace("\\", "/")
 
+
+# 路径修复不在读请求里就地 commit（读接口写库 = 写放大 + 锁竞争），
+# 而是丢进队列，由单个后台线程攒 2 秒一批写回
+import queue
+import threading
+import time
+
+_heal_q: "queue.Queue[tuple[int, str, str]]" = queue.Queue()
+_heal_lock = threading.Lock()
+_heal_worker: threading.Thread | None = None
+
+
+def _heal_loop(app):
+    while True:
+        first = _heal_q.get()
+        time.sleep(2.0)  # 攒批窗口
+        batch = {(first[0], first[1]): first[2]}
+        while True:
+            try:
+                iid, field, value = _heal_q.get_nowait()
+            except queue.Empty:
+                break
+            batch[(iid, field)] = value
+        with app.app_context():
+            try:
+                for (iid, field), value in batch.items():
+                    db.session.query(ImageModel).filter(ImageModel.id == iid) \
+                        .update({field: value}, synchronize_session=False)
+                db.session.commit()
+            except Exception:
+                db.session.rollback()
+
+
+def _queue_path_heal(image_id: int, field: str, value: str):
+    global _heal_worker
+    app = current_app._get_current_object()
+    _heal_q.put((image_id, field, value))
+    if _heal_worker is None:
+        with _heal_lock:
+            if _heal_worker is None:
+                _heal_worker = threading.Thread(
+                    target=_heal_loop, args=(app,), daemon=True)
+                _heal_worker.start()
+
+
+# 删除接口的磁盘清理同样丢给后台线程：HTTP 响应在行删掉后立刻返回，
+# unlink 的 IO 不占请求时延
+_rm_q: "queue.Queue[str]" = queue.Queue()
+_rm_worker: threading.Thread | None = None
+
+
+def _rm_loop():
+    while True:
+        path = _rm_q.get()
+        try:
+            os.unlink(path)  # 比先 exists 再 remove 少一次 stat
+        except FileNotFoundError:
+            pass
+        except OSError:
+            pass
+
+
+def _queue_file_removal(*paths: str | None):
+    global _rm_worker
+    for p in paths:
+        if p:
+            _rm_q.put(p)
+    if _rm_worker is None:
+        with _heal_lock:
+            if _rm_worker is None:
+                _rm_worker = threading.Thread(target=_rm_loop, daemon=True)
+                _rm_worker.start()
+
 def _data_dir() -> str:
-    return current_app.config.get(
-        "DATA_DIR",
-        os.path.abspath(os.path.join(current_app.root_path, "..", "data"))
-    )
+    # create_app 启动时已 abspath 好，这里纯字典查找
+    return current_app.config["DATA_DIR"]
 
 def _img_store_path(sha: str) -> str:
-    return os.path.join(_data_dir(), "images", sha[:2], sha[2:4], sha)
+    return image_path_for_sha(sha, _data_dir())
 
 def _thumb_store_path(sha: str) -> str:
-    return os.path.join(_data_dir(), "thumbs", sha[:2], sha[2:4], f"{sha}.jpg")
+    return thumb_path_for_sha(sha, _data_dir())
+
+def _x_accel_response(path: str, mime: str):
+    """
+    USE_X_ACCEL=1 时把文件下发交给前置 nginx（sendfile 零拷贝），
+    Python 只回一个带 X-Accel-Redirect 头的空响应。
+    需要 nginx 配置 `location /_protected/ { internal; alias <DATA_DIR>/; }`。
+    路径落在 DATA_DIR 之外时返回 None，走 send_file 兜底。
+    """
+    from flask import Response
+    root = os.path.abspath(_data_dir())
+    rel = os.path.relpath(os.path.abspath(path), root)
+    if rel.startswith(".."):
+        return None
+    resp = Response(status=200)
+    resp.headers["X-Accel-Redirect"] = "/_protected/" + rel.replace(os.sep, "/")
+    resp.headers["Content-Type"] = mime
+    return resp
+
+
+def _send_image_file(path: str, mime: str):
+    """统一出口：优先 X-Accel，否则 send_file（conditional=True 让 304 生效）。"""
+    if current_app.config.get("USE_X_ACCEL"):
+        resp = _x_accel_response(path, mime)
+        if resp is not None:
+            return resp
+    return send_file(path, mimetype=mime, as_attachment=False, conditional=True)
+
 
 def _ensure_dir(p: str):
     os.makedirs(os.path.dirname(p), exist_ok=True)
 
+# 正在生成中的缩略图：并发请求同一张缺失缩略图时只让第一个真正去生成，
+# 其余请求拿着 Event 等赢家收尾（封顶几秒），不会看到瞬时 404
+_thumbs_in_progress: dict[str, threading.Event] = {}
+_thumbs_lock = threading.Lock()
+_THUMB_WAIT_S = 5.0
+
+
 def _ensure_thumb(src_path: str, thumb_path: str, size: int = 512):
     if os.path.exists(thumb_path):
         return
-    _ensure_dir(thumb_path)
-    with PILImage.open(src_path) as im:
-        im.thumbnail((size, size))
-        im.convert("RGB").save(thumb_path, "JPEG", quality=85)
+    with _thumbs_lock:
+        evt = _thumbs_in_progress.get(thumb_path)
+        am_winner = evt is None
+        if am_winner:
+            evt = _thumbs_in_progress[thumb_path] = threading.Event()
+    if not am_winner:
+        # 别人正在生成：等它完成再返回；超时也返回，调用方查文件
+        # 是否落盘后自行兜底
+        evt.wait(_THUMB_WAIT_S)
+        return
+    try:
+        _ensure_dir(thumb_path)
+        if pyvips is not None:
+            # libvips 分块流式处理，不把整图解进内存；JPEG 源还有
+            # shrink-on-load，解码阶段就缩小
+            pyvips.Image.thumbnail(src_path, size, height=size).write_to_file(
+                thumb_path + "[Q=85,optimize_coding,strip]")
+        else:
+            with PILImage.open(src_path) as im:
+                # draft：JPEG 在 IDCT 阶段先粗缩，跳过大部分像素解码
+                im.draft("RGB", (size * 2, size * 2))
+                im.thumbnail((size, size))
+                im.convert("RGB").save(thumb_path, "JPEG", quality=85)
+        # 新文件落盘，之前缓存的“不存在”要作废
+        clear_path_caches()
+    finally:
+        with _thumbs_lock:
+            _thumbs_in_progress.pop(thumb_path, None)
+        evt.set()
 
 def _resolve_image_path(img) -> str | None:
-    # 1) 先用数据库记录
-    if img.path and os.path.exists(img.path):
+    # 1) 先用数据库记录（exists 走缓存，热点滚动时省 stat）
+    if img.path and path_exists_cached(img.path):
         return img.path
     # 2) 退化：按 sha256 推导仓储路径
     sha = getattr(img, "sha256", None)
     if sha:
         alt = _img_store_path(sha)
-        if os.path.exists(alt):
+        if path_exists_cached(alt):
             if img.path != _norm(alt):
                 img.path = _norm(alt)
-                from .. import db
-                db.session.commit()
+                _queue_path_heal(img.id, "path", _norm(alt))
             return alt
     return None
 
 def _resolve_thumb_path(img) -> str | None:
     # 若 DB 中的缩略图存在就用
-    if getattr(img, "thumb_path", None) and os.path.exists(img.thumb_path):
+    if getattr(img, "thumb_path", None) and path_exists_cached(img.thumb_path):
         return img.thumb_path
     # 否则尝试从原图生成
     src = _resolve_image_path(img)
     if not src:
         return None
     thumb = _thumb_store_path(img.sha256)
+    # DB 已存 width/height：原图本来就 ≤512 的 JPEG 不必解码重编，
+    # 硬链接（同盘免拷贝）或复制一份直接当缩略图
+    w, h = img.width or 0, img.height or 0
+    if (0 < w <= 512 and 0 < h <= 512
+            and (img.mime or "").lower() in ("image/jpeg", "image/jpg")
+            and not path_exists_cached(thumb)):
+        try:
+            _ensure_dir(thumb)
+            try:
+                os.link(src, thumb)
+            except OSError:
+                import shutil
+                shutil.copyfile(src, thumb)
+            clear_path_caches()
+        except Exception:
+            pass  # 链接失败就走正常生成
     try:
         _ensure_thumb(src, thumb, 512)
     except Exception:
         traceback.print_exc()
         return None
+    if not os.path.exists(thumb):
+        # 生成失败或等赢家超时：退回原图，保证本次请求有图可发
+        return src
     if getattr(img, "thumb_path", None) != _norm(thumb):
         img.thumb_path = _norm(thumb)
-        from .. import db
-        db.session.commit()
+        _queue_path_heal(img.id, "thumb_path", _norm(thumb))
     return thumb
 
 # 下载用的扩展名推断与文件名
@@ -219,20 +474,31 @@ _EXT_MAP = {
     "image/png": ".png",  "image/webp": ".webp",
     "image/bmp": ".bmp",  "image/tiff": ".tiff",
 }
-def _infer_ext(img) -> str:
-    if getattr(img, "mime", None):
-        mt = img.mime.lower()
+
+# mimetypes 的全局表在这里一次性建好，别让首个下载请求付懒加载代价
+mimetypes.init()
+
+
+@lru_cache(maxsize=4096)
+def _ext_for(mime: str | None, path_ext: str | None) -> str:
+    """(mime, 路径后缀) → 下载扩展名；组合就几十种，lru_cache 后
+    热路径上不再反复过 mimetypes.guess_extension。"""
+    if mime:
+        mt = mime.lower()
         ext = _EXT_MAP.get(mt) or (mimetypes.guess_extension(mt) or "")
         if ext in (".jpe", ".jpeg"):
             ext = ".jpg"
         if ext:
             return ext
-    if getattr(img, "path", None):
-        _, ext = os.path.splitext(img.path)
-        if ext:
-            return ext.lower()
+    if path_ext:
+        return path_ext.lower()
     return ".jpg"
 
+
+def _infer_ext(img) -> str:
+    _, pext = os.path.splitext(getattr(img, "path", "") or "")
+    return _ext_for(getattr(img, "mime", None), pext or None)
+
 def _download_filename(img) -> str:
     prefix = (getattr(img, "category", None) or "image").replace("/", "_")
     return f"{prefix}-{img.id}{_infer_ext(img)}"
@@ -258,11 +524,7 @@ def download(image_id):
     if not path or not os.path.exists(path):
         sha = getattr(i, "sha256", None)
         if sha:
-            data_dir = current_app.config.get(
-                "DATA_DIR",
-                os.path.abspath(os.path.join(current_app.root_path, "..", "data"))
-            )
-            alt = os.path.join(data_dir, "images", sha[:2], sha[2:4], sha)
+            alt = _img_store_path(sha)
             if os.path.exists(alt):
                 path = alt
 
@@ -274,6 +536,15 @@ def download(image_id):
             or mimetypes.guess_type(path)[0]
             or "application/octet-stream")
 
+    # 下载也走 X-Accel（审计已在上面落库，字节搬运交给 nginx）；
+    # attachment 文件名由 Flask 侧的头带上
+    if current_app.config.get("USE_X_ACCEL"):
+        resp = _x_accel_response(path, mime)
+        if resp is not None:
+            resp.headers["Content-Disposition"] = \
+                f'attachment; filename="{_download_filename(i)}"'
+            return resp
+
     return send_file(
         path,
         mimetype=mime,
@@ -303,20 +574,35 @@ def similar_by_id(image_id: int):
     seed = ImageModel.query.get_or_404(image_id)
     seed_cat = (seed.category or "").strip()  # 可能为空字符串
 
-    vm = current_app.extensions.get("vec_model")
-    fs = current_app.extensions.get("faiss_store")
+    from .. import get_vec_model, get_faiss_store
+    vm = get_vec_model(current_app)
+    fs = get_faiss_store(current_app)
     if vm is None or fs is None:
         return jsonify(error="vector search unavailable"), 503
 
-    if not seed.path or not os.path.exists(seed.path):
-        return jsonify(error="image file missing"), 404
+    # 快路径：种子图本来就在索引里，直接 reconstruct 取回存好的向量，
+    # 免掉整次模型前向（该接口此前的大头开销）
+    qv = None
+    if hasattr(fs, "reconstruct"):
+        try:
+            qv = fs.reconstruct(image_id)
+        except Exception:
+            qv = None
 
-    try:
-        qv = vm.embed_image(seed.path)
+    if qv is None:
+        # 回退：索引里没有（或类型不支持 reconstruct）才重新嵌入
+        if not seed.path or not os.path.exists(seed.path):
+            return jsonify(error="image file missing"), 404
+        try:
+            qv = vm.embed_image(seed.path)
+        except Exception as e:
+            return jsonify(error=f"search failed: {e}"), 500
 
+    try:
         # 为了过滤同类后还能凑足 k 条，这里先多取一些候选
         topN = max(k * 5, k + 32)
-        raw_hits = fs.search(qv, k=topN)  # [(id, score)]，score 越大越相似/越好
+        # (ids, scores) 两个 numpy 数组，score 越大越相似/越好（降序）
+        hit_ids, hit_scores = fs.search(qv, k=topN)
     except Exception as e:
         return jsonify(error=f"search failed: {e}"), 500
 
@@ -328,39 +614,29 @@ def similar_by_id(image_id: int):
         "category": seed_cat or ""
     }
 
-    # 先按 include_self 处理去重
-    cand_pairs = [(int(iid), float(score)) for iid, score in raw_hits]
-    if not include_self:
-        cand_pairs = [(iid, s) for (iid, s) in cand_pairs if iid != image_id]
-
-    # 如果需要按同类过滤：一次性把候选 id 的类别查出来
-    if same_category:
+    # 如果需要按同类过滤：类别条件直接下推到一条 Core IN 查询里，
+    # 返回裸 id 元组——不走 ORM 构造/identity map，非同类候选根本不取回
+    ok_ids = None
+    if same_category and hit_ids.size:
+        stmt = select(ImageModel.id).where(ImageModel.id.in_(hit_ids.tolist()))
         if seed_cat == "":
-            # “无类别”视为同类（即候选也必须无类别/空字符串/NULL）
-            imgs = (
-                ImageModel.query.options(load_only(ImageModel.id, ImageModel.category))
-                .filter(ImageModel.id.in_([iid for iid, _ in cand_pairs]))
-                .all()
-            )
-            by_id = {x.id: (x.category or "") for x in imgs}
-            cand_pairs = [(iid, s) for (iid, s) in cand_pairs if (by_id.get(iid, "") == "")]
+            # “无类别”视为同类（候选也必须 NULL/空字符串）
+            stmt = stmt.where(or_(ImageModel.category.is_(None),
+                                  ImageModel.category == ""))
         else:
-            imgs = (
-                ImageModel.query.options(load_only(ImageModel.id, ImageModel.category))
-                .filter(ImageModel.id.in_([iid for iid, _ in cand_pairs]))
-                .all()
-            )
-            by_id = {x.id: (x.category or "") for x in imgs}
-            cand_pairs = [(iid, s) for (iid, s) in cand_pairs if by_id.get(iid, "") == seed_cat]
-
-    # 截断到 k 条，保持 FS 返回的相似度顺序（已经是降序）
-    cand_pairs = cand_pairs[:k]
-
-    # 构造返回
-    items = [{
-        "id": iid,
-        "score": _to01(score) if _to01(score) is not None else 0.0
-    } for iid, score in cand_pairs]
+            stmt = stmt.where(ImageModel.category == seed_cat)
+        ok_ids = {int(i) for (i,) in db.session.execute(stmt)}
+
+    # 分数映射 [-1,1]→[0,1] 对整个候选数组一次 np.clip 算完，
+    # 之后 tolist 出来的已是原生 int/float；去自身 + 同类过滤 + 截断
+    # 到 k 条仍是单次遍历（保持 FAISS 的降序）
+    score01 = np.clip((hit_scores + 1.0) * 0.5, 0.0, 1.0)
+    items = [{"id": iid, "score": s}
+             for iid, s in islice(
+                 ((iid, s) for iid, s in zip(hit_ids.tolist(), score01.tolist())
+                  if (include_self or iid != image_id)
+                  and (ok_ids is None or iid in ok_ids)),
+                 k)]
 
     # include_self 情况：把自己插到最前面（items 仍保持 id/score 字段）
     if include_self:
@@ -373,19 +649,37 @@ def similar_by_id(image_id: int):
 @jwt_required(optional=True)
 def delete_image(image_id):
     """Delete DB record + files, and audit."""
-    i = ImageModel.query.get_or_404(image_id)
+    # 只取文件路径两列（后面交给后台线程 unlink 用），不把整个 ORM
+    # 实例拉进 identity map
+    row = db.session.execute(
+        select(ImageModel.path, ImageModel.thumb_path)
+        .where(ImageModel.id == image_id)).first()
+    if row is None:
+        abort(404)
     user_id = get_jwt_identity()
 
-    _safe_remove(i.path)
-    _safe_remove(i.thumb_path)
-
-    log = AuditLog(
+    # 行删除用 Core DELETE（免掉 session.delete 为级联做的关系加载）；
+    # ORM 级联不生效了，子表也各补一条 DELETE，仍在同一事务一次 commit
+    from ..models import Embedding, OcrText, ImageTag
+    for child in (Embedding, OcrText, ImageTag):
+        db.session.execute(
+            delete(child).where(child.image_id == image_id)
+            .execution_options(synchronize_session=False))
+    db.session.execute(
+        delete(ImageModel).where(ImageModel.id == image_id)
+        .execution_options(synchronize_session=False))
+    db.session.add(AuditLog(
         user_id=user_id,
-        action="delete", target_type="image", target_id=i.id,
+        action="delete", target_type="image", target_id=image_id,
         ip=None, ua=None
-    )
-    db.session.add(log)
-
-    db.session.delete(i)
+    ))
     db.session.commit()
+
+    # 磁盘清理异步做：响应不等 unlink
+    _queue_file_removal(row.path, row.thumb_path)
+    clear_path_caches()
+    # Core DELETE 不触发 ORM 事件，手动失效列表缓存和 analytics summary 缓存
+    _bump_list_cache()
+    from .analytics import invalidate_summary_cache
+    invalidate_summary_cache()
     return jsonify(ok=True, deleted=image_id)
@@ -1,9 +1,14 @@
 # app/api/logs.py
 from __future__ import annotations
-from flask import Blueprint, request, jsonify, Response
+from flask import Blueprint, request, jsonify, Response, stream_with_context
 from datetime import datetime
 from sqlalchemy import desc
-import csv, io, json
+import csv, json
+
+try:
+    import orjson
+except Exception:
+    orjson = None
 
 from ..extensions import db
 from ..models import AuditLog
@@ -21,21 +26,18 @@ def _parse_dt(s):
         except Exception:
             return None
 
-@bp.get("/audit")
-def audit_list():
-    """
-    GET /api/audit?limit=200&action=download&level=INFO&from=2025-11-01&to=2025-11-30&user_id=1&q=cat
-    """
+def _build_audit_query(args):
+    """按查询参数拼过滤条件；audit_list / audit_export 共用，导出不再
+    test_request_context 重新进一遍视图。"""
     q = AuditLog.query
 
-    # 过滤
-    action = request.args.get("action")
-    level  = request.args.get("level")
-    user_id = request.args.get("user_id", type=int)
-    status = request.args.get("status")
-    s_from = _parse_dt(request.args.get("from"))
-    s_to   = _parse_dt(request.args.get("to"))
-    kw     = request.args.get("q")
+    action = args.get("action")
+    level  = args.get("level")
+    user_id = args.get("user_id", type=int)
+    status = args.get("status")
+    s_from = _parse_dt(args.get("from"))
+    s_to   = _parse_dt(args.get("to"))
+    kw     = args.get("q")
 
     if action: q = q.filter(AuditLog.action == action)
     if level:  q = q.filter(AuditLog.level  == level)
@@ -50,23 +52,46 @@ def audit_list():
             (AuditLog.meta_json.ilike(like)) |
             (AuditLog.ua.ilike(like))
         )
+    return q
 
+def _meta_value(meta_json):
+    """
+    meta_json 在库里已经是合法 JSON 字符串。orjson 在时用 Fragment 原样拼进
+    响应，免去每行 loads+dumps；退回 stdlib json 时才真正 parse。
+    """
+    if orjson is not None:
+        return orjson.Fragment(meta_json or "{}")
+    return json.loads(meta_json or "{}")
+
+def _row(x: AuditLog):
+    return {
+        "id": x.id,
+        "ts": x.created_at.isoformat() if x.created_at else None,
+        "user_id": x.user_id,
+        "action": x.action, "level": x.level, "status": x.status,
+        "target_type": x.target_type, "target_id": x.target_id,
+        "ip": x.ip, "ua": x.ua,
+        "message": x.message,
+        "meta": _meta_value(x.meta_json),
+    }
+
+@bp.get("/audit")
+def audit_list():
+    """
+    GET /api/audit?limit=200&action=download&level=INFO&from=2025-11-01&to=2025-11-30&user_id=1&q=cat
+    """
+    q = _build_audit_query(request.args)
     limit = min(request.args.get("limit", 200, type=int), 1000)
     rows = q.order_by(desc(AuditLog.id)).limit(limit).all()
+    return jsonify({"items": [_row(r) for r in rows], "count": len(rows)})
 
-    def _row(x: AuditLog):
-        return {
-            "id": x.id,
-            "ts": x.created_at.isoformat() if x.created_at else None,
-            "user_id": x.user_id,
-            "action": x.action, "level": x.level, "status": x.status,
-            "target_type": x.target_type, "target_id": x.target_id,
-            "ip": x.ip, "ua": x.ua,
-            "message": x.message,
-            "meta": json.loads(x.meta_json or "{}"),
-        }
+class _Echo:
+    """csv.writer 的出口：write 原样返回，行直接交给生成器 yield。"""
+    def write(self, v):
+        return v
 
-    return jsonify({"items": [_row(r) for r in rows], "count": len(rows)})
+_CSV_FIELDS = ["id", "ts", "user_id", "action", "level", "status",
+               "target_type", "target_id", "ip", "ua", "message", "meta"]
 
 @bp.get("/audit/export")
 def audit_export():
@@ -75,28 +100,38 @@ def audit_export():
     /api/audit/export?format=csv&limit=500
     """
     fmt = (request.args.get("format") or "csv").lower()
-    req = request.args.copy()
-    req["limit"] = request.args.get("limit", 10000)  # 导出默认给大些
-
-    with bp.test_request_context(query_string=req):  # 复用上面的选择逻辑
-        data = audit_list().json
+    limit = request.args.get("limit", 10000, type=int)  # 导出默认给大些
 
-    items = data["items"]
+    q = _build_audit_query(request.args)
 
     if fmt == "json":
-        return jsonify(items)
-
-    # CSV
-    output = io.StringIO()
-    writer = csv.DictWriter(output, fieldnames=[
-        "id","ts","user_id","action","level","status",
-        "target_type","target_id","ip","ua","message","meta"])
-    writer.writeheader()
-    for r in items:
-        r = r.copy(); r["meta"] = json.dumps(r["meta"], ensure_ascii=False)
-        writer.writerow(r)
-
-    csv_bytes = output.getvalue().encode("utf-8-sig")  # 带 BOM 便于 Excel
-    return Response(csv_bytes,
+        rows_iter = q.order_by(desc(AuditLog.id)).limit(limit).yield_per(1000)
+        return jsonify([_row(r) for r in rows_iter])
+
+    # CSV 逐行流出：只取要导出的列（裸元组游标，不构造 AuditLog 实例、
+    # 不进 identity map），yield_per 批量取、_Echo 直写响应，
+    # meta 列原样透传 meta_json（省掉每行 loads+dumps 往返）
+    rows_iter = (q.with_entities(
+                    AuditLog.id, AuditLog.created_at, AuditLog.user_id,
+                    AuditLog.action, AuditLog.level, AuditLog.status,
+                    AuditLog.target_type, AuditLog.target_id,
+                    AuditLog.ip, AuditLog.ua, AuditLog.message,
+                    AuditLog.meta_json)
+                 .order_by(desc(AuditLog.id)).limit(limit).yield_per(1000))
+
+    def generate():
+        w = csv.writer(_Echo())
+        yield "\ufeff"  # BOM，Excel 识别 UTF-8
+        yield w.writerow(_CSV_FIELDS)
+        for x in rows_iter:
+            yield w.writerow((
+                x.id,
+                x.created_at.isoformat() if x.created_at else "",
+                x.user_id, x.action, x.level, x.status,
+                x.target_type, x.target_id, x.ip, x.ua, x.message,
+                x.meta_json or "{}",
+            ))
+
+    return Response(stream_with_context(generate()),
         headers={"Content-Disposition": "attachment; filename=audit.csv"},
         mimetype="text/csv; charset=utf-8")
@@ -1,6 +1,10 @@
 # app/api/maintenance.py
+import os
+from concurrent.futures import ProcessPoolExecutor
+
 from flask import Blueprint, request, jsonify, current_app
 from flask_jwt_extended import jwt_required
+from sqlalchemy import func, select
 from .. import db
 from ..models import Image as ImageModel, OcrText
 from ..services.ocr import run_ocr
@@ -10,10 +14,17 @@ bp = Blueprint("maintenance", __name__)
 @bp.get("/api/maintenance/_counts")
 @jwt_required(optional=True)
 def counts():
-    images_total = db.session.query(ImageModel).count()
-    ocr_covered = db.session.query(OcrText).count()
-    fs = current_app.extensions.get("faiss_store")
-    faiss_ntotal = fs.ntotal() if fs else 0
+    # 平铺的 SELECT count(*)：Query.count() 会包一层子查询，
+    # Postgres 上就吃不到 index-only scan
+    images_total = db.session.execute(
+        select(func.count()).select_from(ImageModel)).scalar_one()
+    ocr_covered = db.session.execute(
+        select(func.count()).select_from(OcrText)).scalar_one()
+    from .. import get_faiss_store
+    fs = get_faiss_store(current_app)
+    # ntotal 在 FaissStore 上是 property；兼容旧实现的方法形式
+    nt = getattr(fs, "ntotal", 0) if fs else 0
+    faiss_ntotal = int(nt() if callable(nt) else nt)
     return jsonify(
         images_total=images_total,
         ocr_covered=ocr_covered,
@@ -21,6 +32,55 @@ def counts():
         ocr_coverage=(ocr_covered / images_total) if images_total else 0.0
     )
 
+@bp.post("/api/maintenance/rebuild_faiss")
+@jwt_required(optional=True)
+def rebuild_faiss():
+    """
+    从 DB 全量重建 FAISS 索引。默认 nlist≈√N 的 IVF（见 FaissStore.rebuild）：
+    追加式的 Flat/IVF1 在库过几万张后每查都是整库线性扫描，重建成真 IVF
+    之后只摸 nprobe 个桶（FAISS_NPROBE 可调）。可传 {"factory": "..."}
+    强制指定 factory 串。向量读取走 Embedding.vector()，int8 行自动反量化。
+    """
+    from ..models import Embedding
+    from .. import get_faiss_store
+    fs = get_faiss_store(current_app)
+    if fs is None or not hasattr(fs, "rebuild"):
+        return jsonify(ok=False, error="faiss store unavailable"), 500
+    data = request.get_json(silent=True) or {}
+    ids: list[int] = []
+    vecs: list = []
+    for rec in db.session.query(Embedding).yield_per(1000):
+        try:
+            vecs.append(rec.vector())
+            ids.append(rec.image_id)
+        except Exception:
+            continue  # 个别坏行不挡重建
+    import numpy as np
+    if ids:
+        n = fs.rebuild(np.asarray(ids, dtype=np.int64), np.stack(vecs),
+                       factory_str=data.get("factory"))
+    else:
+        n = fs.rebuild(np.empty(0, dtype=np.int64),
+                       np.empty((0, fs.dim), dtype=np.float32),
+                       factory_str=data.get("factory"))
+    return jsonify(ok=True, ntotal=n, factory=fs.index_factory_str)
+
+
+def _upsert_ocr_batch(rows: list[dict]) -> None:
+    """一条 UPSERT 写入整批 {image_id, text}，按方言选 insert 实现。"""
+    if not rows:
+        return
+    if db.engine.dialect.name == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert as _insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert as _insert
+    stmt = _insert(OcrText).values(rows)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=["image_id"], set_={"text": stmt.excluded.text})
+    db.session.execute(stmt)
+    db.session.commit()
+
+
 @bp.post("/api/maintenance/reindex_ocr")
 @jwt_required(optional=True)
 def reindex_ocr():
@@ -30,17 +90,32 @@ def reindex_ocr():
     end_id = int(data.get("end_id", 1 << 30))
     q = ImageModel.query.filter(ImageModel.id.between(start_id, end_id))
     n_ok = 0
-    for img in q.yield_per(100):
+    # OCR 是 CPU 密集且逐图独立：丢进进程池并行跑（每个 worker 进程
+    # 首次调用时自己懒加载 OCR 引擎，见 services/ocr.py 的模块级缓存）；
+    # 识别结果仍攒批后单条 UPSERT、按批提交，往返 O(N/batch)
+    workers = int(os.environ.get("OCR_WORKERS") or (os.cpu_count() or 1))
+    BATCH = 500
+
+    def _flush(ids: list[int], paths: list[str], ex) -> None:
+        nonlocal n_ok
+        rows = [{"image_id": iid, "text": txt}
+                for iid, txt in zip(ids, ex.map(run_ocr, paths, chunksize=4))
+                if txt]
         try:
-            txt = run_ocr(img.path)
-            if txt:
-                row = db.session.get(OcrText, img.id)
-                if row:
-                    row.text = txt
-                else:
-                    db.session.add(OcrText(image_id=img.id, text=txt))
-                n_ok += 1
+            _upsert_ocr_batch(rows)
+            n_ok += len(rows)
         except Exception:
-            pass
-    db.session.commit()
+            db.session.rollback()
+
+    ids: list[int] = []
+    paths: list[str] = []
+    with ProcessPoolExecutor(max_workers=workers) as ex:
+        for img in q.yield_per(100):
+            ids.append(img.id)
+            paths.append(img.path)
+            if len(ids) >= BATCH:
+                _flush(ids, paths, ex)
+                ids, paths = [], []
+        if ids:
+            _flush(ids, paths, ex)
     return jsonify(ok=True, updated=n_ok, range=[start_id, end_id])
@@ -1,14 +1,17 @@
 # app/api/search.py
 from __future__ import annotations
+import hashlib
 import os
 import tempfile
+import time
+from functools import lru_cache
 from typing import Iterable, List, Tuple, Optional
 
 import numpy as np
 
 from flask import Blueprint, request, jsonify, current_app
 from flask_jwt_extended import jwt_required
-from sqlalchemy import select, func
+from sqlalchemy import select, func, text
 from .. import db
 from ..models import Image as ImageModel, OcrText, Embedding
 
@@ -27,8 +30,16 @@ def _to01(score: Optional[float]) -> Optional[float]:
 def _norm_hits(hits: Iterable) -> List[Tuple[int, Optional[float]]]:
     """
     Normalize FAISS hits into [(id, score?)].
-    Accepts: [(id, score)], [id], numpy arrays, etc.
+    Accepts: (ids_np, scores_np), [(id, score)], [id], numpy arrays, etc.
     """
+    # FaissStore.search 的新返回：两个对齐的 numpy 数组，ravel+tolist
+    # 一次转完（兼容裸 faiss 的 I[1,k]/D[1,k] 形状），之后 zip 即是
+    # 原生 int/float，对每个命中不再走 isinstance/try-except 分发
+    if (isinstance(hits, tuple) and len(hits) == 2
+            and all(isinstance(x, np.ndarray) for x in hits)):
+        ids, scores = hits
+        return list(zip(ids.ravel().astype(np.int64, copy=False).tolist(),
+                        scores.ravel().astype(np.float32, copy=False).tolist()))
     out: List[Tuple[int, Optional[float]]] = []
     for h in hits:
         # tuple/list (id, score)
@@ -47,11 +58,86 @@ def _norm_hits(hits: Iterable) -> List[Tuple[int, Optional[float]]]:
             continue
     return out
 
+try:
+    from numba import njit as _njit  # 可选依赖；没装走 numpy 路径
+except Exception:
+    _njit = None
+
+
+def _score01_np(scores: np.ndarray) -> np.ndarray:
+    """[-1,1] → [0,1]，原地算：一次分配，无 (s+1)、(s+1)*0.5 两个临时数组。"""
+    out = scores + 1.0
+    out *= 0.5
+    np.clip(out, 0.0, 1.0, out=out)
+    return out
+
+
+if _njit is not None:
+    @_njit(cache=True)
+    def _score01_kernel(scores):  # pragma: no cover - numba 编译体
+        out = np.empty_like(scores)
+        for i in range(scores.shape[0]):
+            v = (scores[i] + 1.0) * 0.5
+            out[i] = 0.0 if v < 0.0 else (1.0 if v > 1.0 else v)
+        return out
+
+    def _score01_arr(scores: np.ndarray) -> np.ndarray:
+        try:
+            return _score01_kernel(np.ascontiguousarray(scores))
+        except Exception:
+            return _score01_np(scores)
+else:
+    _score01_arr = _score01_np
+
+
+def _hits_payload(raw_hits) -> List[dict]:
+    """
+    hits → [{image_id, score, score01}]。FaissStore 返回 numpy 数组对时
+    分数映射用一次 np.clip 整批算完（不再每个命中各调一遍 _to01）；
+    其它形状走 _norm_hits 的逐元素兼容路径。
+    """
+    if (isinstance(raw_hits, tuple) and len(raw_hits) == 2
+            and isinstance(raw_hits[0], np.ndarray)):
+        ids, scores = raw_hits
+        scores = scores.astype(np.float32, copy=False)
+        scores01 = _score01_arr(scores)
+        return [{"image_id": i, "score": s, "score01": s01}
+                for i, s, s01 in zip(ids.tolist(), scores.tolist(),
+                                     scores01.tolist())]
+    hits = _norm_hits(raw_hits)
+    if not hits:
+        return []
+    ids_list, scores_list = zip(*hits)
+    if None not in scores_list:
+        # 兼容路径拿到的也是全量分数时，同样整批 clip，一个命中一个
+        # _to01 调用（函数帧 + max/min）就省下来了
+        scores01 = _score01_arr(
+            np.asarray(scores_list, dtype=np.float32)).tolist()
+        return [{"image_id": i, "score": s, "score01": s01}
+                for i, s, s01 in zip(ids_list, scores_list, scores01)]
+    return [{"image_id": i, "score": s, "score01": _to01(s)} for i, s in hits]
+
 def _get_vm_and_index():
-    vm = current_app.extensions.get("vec_model")
-    fs = current_app.extensions.get("faiss_store")
+    # 懒加载：首个检索请求在这里触发 VecModel/FaissStore 初始化
+    from .. import get_vec_model, get_faiss_store
+    vm = get_vec_model(current_app)
+    fs = get_faiss_store(current_app)
     return vm, fs
 
+@lru_cache(maxsize=4096)
+def _embed_text_cached(vm_key: int, q: str) -> np.ndarray:
+    """
+    热门查询词的文本向量缓存：CLIP 文本塔一次前向要几十毫秒，重复查询
+    直接命中返回。key 带 id(vm)，/_reload 换模型后旧条目自然失效（存
+    的是 id 不是引用，不会把旧模型钉在内存里）；返回只读数组，防止
+    调用方原地改动污染缓存。
+    """
+    from .. import get_vec_model
+    vm = get_vec_model(current_app)
+    arr = np.asarray(vm.embed_text(q), dtype=np.float32)
+    arr.setflags(write=False)
+    return arr
+
 @bp.get("/api/search")
 @jwt_required(optional=True)
 def search_text():
@@ -65,11 +151,45 @@ def search_text():
     if vm is None or fs is None:
         return jsonify(error="vector search unavailable"), 503
 
-    qv = vm.embed_text(q)  # normalized [dim]
+    qv = _embed_text_cached(id(vm), q)  # normalized [dim]，重复查询免前向
     raw_hits = fs.search(qv, k=k)  # tolerant to various return formats
-    hits = _norm_hits(raw_hits)
-    results = [{"image_id": i, "score": s, "score01": _to01(s)} for i, s in hits]
-    return jsonify(results=results)
+    return jsonify(results=_hits_payload(raw_hits))
+
+# 查询图向量缓存：同一张图重复上传（UI 重试/重拖缩略图）时 CLIP 图像塔
+# 的前向是确定性的，按内容 sha256 缓存直接复用。key 带 id(vm)，换模型后
+# 旧条目自然失效；满了整体清空（同 images.py 列表缓存的简单策略）
+_QVEC_CACHE: dict[tuple[int, str], np.ndarray] = {}
+_QVEC_CACHE_MAX = 512
+
+
+def _cached_query_vec(vm, sha: str) -> Optional[np.ndarray]:
+    """缓存/库里找查询向量：先查进程内缓存，再查 Embedding 表
+    （同内容的图已入库时连一次前向都不用付）。未命中返回 None。"""
+    key = (id(vm), sha)
+    hit = _QVEC_CACHE.get(key)
+    if hit is not None:
+        return hit
+    try:
+        rec = db.session.execute(
+            select(Embedding)
+            .join(ImageModel, ImageModel.id == Embedding.image_id)
+            .where(ImageModel.sha256 == sha)
+        ).scalars().first()
+        if rec is not None:
+            return _remember_query_vec(vm, sha, rec.vector())
+    except Exception:
+        db.session.rollback()
+    return None
+
+
+def _remember_query_vec(vm, sha: str, vec) -> np.ndarray:
+    vec = np.asarray(vec, dtype=np.float32)
+    vec.setflags(write=False)  # 只读，防调用方原地改动污染缓存
+    if len(_QVEC_CACHE) >= _QVEC_CACHE_MAX:
+        _QVEC_CACHE.clear()
+    _QVEC_CACHE[(id(vm), sha)] = vec
+    return vec
+
 
 @bp.post("/api/search_by_image")
 @jwt_required(optional=True)
@@ -84,16 +204,35 @@ def search_by_image():
     if vm is None or fs is None:
         return jsonify(error="vector search unavailable"), 503
 
+    # 整个查询图读进内存（查询图都是单张小文件），顺手算内容 sha256：
+    # 缓存命中/已入库的图直接拿现成向量，省掉整个 CLIP 图像塔前向
+    data = f.read()
+    sha = hashlib.sha256(data).hexdigest()
+    qv = _cached_query_vec(vm, sha)
+    if qv is not None:
+        raw_hits = fs.search(qv, k=k)
+        return jsonify(results=_hits_payload(raw_hits))
+
+    # 查询图直接在内存里解码编码：省掉 mkstemp 落盘 + 重新读回的整趟拷贝
+    if hasattr(vm, "embed_image_bytes"):
+        try:
+            qv = vm.embed_image_bytes(data)
+        except Exception as e:
+            return jsonify(error=f"bad image: {e}"), 400
+        qv = _remember_query_vec(vm, sha, qv)
+        raw_hits = fs.search(qv, k=k)
+        return jsonify(results=_hits_payload(raw_hits))
+
+    # 老版 VecModel（只有按路径的 embed_image）才走临时文件
     fd, path = tempfile.mkstemp(prefix="qimg_", suffix=".bin",
                                 dir=current_app.config["UPLOAD_DIR"])
-    os.close(fd)
     try:
-        f.save(path)
+        with os.fdopen(fd, "wb") as fh:
+            fh.write(data)
         qv = vm.embed_image(path)
+        qv = _remember_query_vec(vm, sha, qv)
         raw_hits = fs.search(qv, k=k)
-        hits = _norm_hits(raw_hits)
-        results = [{"image_id": i, "score": s, "score01": _to01(s)} for i, s in hits]
-        return jsonify(results=results)
+        return jsonify(results=_hits_payload(raw_hits))
     finally:
         try:
             os.remove(path)
@@ -109,6 +248,24 @@ def search_ocr():
     if not q:
         return jsonify(error="empty query"), 400
 
+    # FTS5 快路径（SQLite，见 create_app 的建表/触发器）：MATCH 走倒排索引，
+    # 不用全表 ILIKE 扫。查询词整体加引号做短语匹配，顺便挡掉 FTS 语法字符。
+    if current_app.config.get("OCR_FTS_READY"):
+        try:
+            match = '"' + q.replace('"', '""') + '"'
+            # scalars()：直接拿 int 列表，不为每行包一个 Row 对象
+            ids = db.session.scalars(
+                text("SELECT rowid FROM ocr_text_fts WHERE ocr_text_fts MATCH :m LIMIT :k"),
+                {"m": match, "k": k},
+            ).all()
+            if ids:
+                results = [{"image_id": int(iid), "score": None, "score01": None}
+                           for iid in ids]
+                return jsonify(results=results)
+        except Exception:
+            pass  # FTS 查询失败 → 落回 ILIKE
+
+    # ILIKE 兜底：非 SQLite、FTS 不可用，或分词匹配不到的子串/前缀场景
     pattern = f"%{q}%"
     stmt = (
         select(OcrText.image_id)
@@ -116,35 +273,30 @@ def search_ocr():
         .where(OcrText.text.ilike(pattern))
         .limit(k)
     )
-    rows = db.session.execute(stmt).all()
-    results = [{"image_id": int(iid), "score": None, "score01": None} for (iid,) in rows]
+    ids = db.session.scalars(stmt).all()
+    results = [{"image_id": int(iid), "score": None, "score01": None} for iid in ids]
     return jsonify(results=results)
 
 # ---------------- Diagnostics & Utilities ---------------- #
 
+# deepcheck 结果缓存：监控按秒级频率打健康检查时，不必每次都把
+# CLIP/FAISS/DB 全链路走一遍——元信息和探针结果在 TTL 内直接复用
+_DEEPCHECK_TTL = 30.0
+_deepcheck_cache: dict = {"ts": 0.0, "out": None}
+
+
 @bp.get("/api/search/_deepcheck")
 def deepcheck():
     """
-    健康检查（鲁棒版）：把可能是 method/np 类型的字段转换成可 JSON 序列化的值，避免 500。
+    健康检查。结果缓存 30 秒（?fresh=1 强制重算）：高频监控只付
+    一次 dict 序列化的成本。字段类型都是本仓库自己的 FaissStore/
+    VecModel，按已知类型直接取值，不再对每个字段做 callable/
+    np.generic 反射兜底。
     """
-    import numpy as np
-
-    def jval(v):
-        """将 v 转成 jsonify 友好的类型：可调用则尝试调用；np 标量转原生；其余转 str。"""
-        try:
-            if callable(v):
-                v = v()
-        except Exception:
-            # 调用失败就保留原值
-            pass
-        # numpy 标量 -> python 标量
-        if isinstance(v, np.generic):
-            return v.item()
-        # 允许的原生类型直接返回
-        if isinstance(v, (type(None), bool, int, float, str)):
-            return v
-        # 其它（例如 Path、enum、对象实例、方法等）做字符串化
-        return str(v)
+    fresh = (request.args.get("fresh") or "0").lower() in ("1", "true", "yes")
+    if (not fresh and _deepcheck_cache["out"] is not None
+            and time.monotonic() - _deepcheck_cache["ts"] < _DEEPCHECK_TTL):
+        return jsonify(_deepcheck_cache["out"])
 
     out = {
         "cfg": {
@@ -157,45 +309,40 @@ def deepcheck():
         "probe": None,
     }
 
+    vm = fs = None
     # model 信息
     try:
-        vm = current_app.extensions.get("vec_model")
+        vm, fs = _get_vm_and_index()
         out["model"]["ok"] = vm is not None
         out["model"]["name"] = current_app.config.get("EMBED_MODEL")
-        out["model"]["dim"]  = jval(getattr(vm, "dim", None))
+        dim = getattr(vm, "dim", None)
+        out["model"]["dim"] = int(dim) if dim is not None else None
     except Exception as e:
         out["model"]["err"] = str(e)
 
-    # faiss 信息
+    # faiss 信息（FaissStore 的这些属性类型是确定的：int/str）
     try:
-        fs = current_app.extensions.get("faiss_store")
         if fs is not None:
-            out["faiss"]["dim"]        = jval(getattr(fs, "dim", None))
-            out["faiss"]["ntotal"]     = jval(getattr(fs, "ntotal", None) or getattr(fs, "n_total", None))
-            out["faiss"]["metric"]     = jval(getattr(fs, "metric", None) or getattr(fs, "METRIC", None))
-            out["faiss"]["index_path"] = jval(getattr(fs, "index_path", None) or getattr(fs, "path", None)
-                                              or current_app.config.get("FAISS_INDEX_PATH"))
+            out["faiss"]["dim"] = int(fs.dim)
+            out["faiss"]["ntotal"] = int(fs.ntotal)
+            out["faiss"]["metric"] = str(fs.metric)
+            out["faiss"]["index_path"] = str(fs.index_path)
             out["faiss"]["ok"] = True
     except Exception as e:
         out["faiss"]["err"] = str(e)
 
     # 探针：随便拿一条 embedding 做一次 search
     try:
-        fs = current_app.extensions.get("faiss_store")
         if fs is not None:
             row = db.session.execute(select(Embedding).limit(1)).scalar_one_or_none()
             if row is not None:
-                vec = np.frombuffer(row.vector_blob, dtype="float32")
+                vec = row.vector()  # 兼容 int8 量化行
                 hits = []
                 if hasattr(fs, "search"):
                     try:
-                        raw = fs.search(vec, k=5) or []
-                        for h in raw:
-                            if isinstance(h, (list, tuple)) and len(h) >= 2:
-                                hits.append([int(h[0]), float(h[1])])
-                            else:
-                                # 只有 id 的情况
-                                hits.append([int(h), None])
+                        raw = fs.search(vec, k=5)
+                        # _norm_hits 兼容数组对 / tuple 列表 / 裸 id 各种形状
+                        hits = [[i, s] for i, s in _norm_hits(raw)]
                     except Exception as e:
                         out["probe"] = {"seed_id": int(row.image_id), "err": str(e)}
                 out["probe"] = out.get("probe") or {"seed_id": int(row.image_id), "hits": hits}
@@ -204,6 +351,8 @@ def deepcheck():
     except Exception as e:
         out["probe"] = {"err": str(e)}
 
+    _deepcheck_cache["out"] = out
+    _deepcheck_cache["ts"] = time.monotonic()
     return jsonify(out)
 
 
@@ -221,18 +370,11 @@ def reload_index():
 
     vm, fs = _get_vm_and_index()
 
-    # Determine dimension
-    dim = None
-    try:
-        dim = getattr(vm, "dim", None)
-        if not dim:
-            # fallback to service constant if present
-            from ..services import embeddings as EMB  # type: ignore
-            dim = getattr(EMB, "DIM", None)
-    except Exception:
-        pass
+    # Determine dimension: config cache -> live model -> known-model table
+    dim = app.config.get("EMBED_DIM") or getattr(vm, "dim", None)
     if not dim:
-        dim = 512
+        from ..vec import known_dim
+        dim = known_dim(app.config.get("EMBED_MODEL")) or 512
 
     # Try reopen on existing store
     try:
@@ -250,6 +392,20 @@ def reload_index():
     # If no usable store, replace it
     if fs is None:
         from ..faiss_store import FaissStore
-        app.extensions["faiss_store"] = FaissStore(dim=int(dim), index_path=path)
+        fs = FaissStore(dim=int(dim), index_path=path,
+                        index_factory_str=app.config.get("FAISS_INDEX_FACTORY"),
+                        nprobe=app.config.get("FAISS_NPROBE"),
+                        autosave=app.config.get("FAISS_AUTOSAVE", True),
+                        efsearch=app.config.get("FAISS_EFSEARCH"))
+        app.extensions["faiss_store"] = fs
+        # 同步懒加载容器，后续 get_faiss_store 拿到的是新实例
+        res = app.extensions.get("lazy_resources")
+        if res is not None:
+            res.faiss_store = fs
+
+    # 重载后照 create_app 的方式后台重新预热，首查不吃冷页 fault
+    if app.config.get("FAISS_PREWARM") and hasattr(fs, "prewarm"):
+        import threading
+        threading.Thread(target=fs.prewarm, daemon=True).start()
 
     return jsonify(ok=True, path=path, dim=int(dim))
@@ -3,12 +3,18 @@ from __future__ import annotations
 
 import os
 import hashlib
+import mmap
+import shutil
+import queue
 import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from mimetypes import guess_type
 
 import numpy as np
 from PIL import Image as PILImage
 from flask import Blueprint, request, current_app, jsonify
+from sqlalchemy import select
 from flask_jwt_extended import jwt_required, get_jwt_identity
 
 from .. import db
@@ -23,125 +29,373 @@ bp = Blueprint("uploads", __name__)
 
 # ---------------- helpers ----------------
 def _sha256_file(fpath: str) -> str:
-    h = hashlib.sha256()
+    # 8KiB Python 循环改走 C 实现：file_digest（3.11+）内部大缓冲读，
+    # 把整块数据喂给 OpenSSL 的 SHA-NI/ARM Crypto 硬件路径。
+    # 上传主链路已改为边写 spool 边哈希（_spool_and_hash）；这里留给
+    # 按路径校验已落盘文件的调用方（修复脚本等）
+
     with open(fpath, "rb") as fh:
-        for chunk in iter(lambda: fh.read(8192), b""):
-            h.update(chunk)
+        if hasattr(hashlib, "file_digest"):
+            return hashlib.file_digest(fh, "sha256").hexdigest()
+        # 老解释器退路：mmap 整段一次 update，同样只有一次 Python 调用
+        h = hashlib.sha256()
+        try:
+            with mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ) as mv:
+                h.update(mv)
+        except ValueError:
+            h.update(fh.read())  # 空文件 mmap 不了
+        return h.hexdigest()
+
+
+def _spool_and_hash(file, spool) -> str:
+    """
+    上传流一边写 spool 一边算 SHA-256（1MiB 缓冲摊薄 syscall、喂饱硬件
+    SHA）。spool 是 SpooledTemporaryFile：≤8MiB 的文件全程驻留内存，
+    去重命中时整个 payload 一个字节都不落盘。
+    """
+    h = hashlib.sha256()
+    readinto = getattr(file.stream, "readinto", None)
+    if readinto is not None:
+        # readinto 复用同一块 1MiB 缓冲：每个 chunk 不再新分配一个
+        # bytes 对象（GB 级上传省掉上千次分配 + memcpy 各一遍）
+        buf = bytearray(1 << 20)
+        mv = memoryview(buf)
+        while n := readinto(buf):
+            h.update(mv[:n])
+            spool.write(mv[:n])
+        return h.hexdigest()
+    while chunk := file.stream.read(1 << 20):
+        h.update(chunk)
+        spool.write(chunk)
     return h.hexdigest()
 
 
-def _gen_thumb(src_path: str, sha: str) -> tuple[int | None, int | None, str | None]:
-    """返回 (width, height, thumb_path)；失败则返回 (None, None, None)"""
+def _materialize_spool(spool, dst_path: str) -> None:
+    """
+    确认不是重复图后，才把 spool 内容写到内容寻址路径：同目录临时
+    文件 + 原子 replace，和原来的 mkstemp 流程一样不会留半截文件。
+    """
+    spool.seek(0)
+    fd, tmp = tempfile.mkstemp(prefix="ing_", dir=os.path.dirname(dst_path))
+    try:
+        # 大文件（spool 已 rollover 成真文件）走 sendfile：字节在内核里
+        # 直接文件→文件，不再经 Python 各读写一遍。注意不能主动调
+        # spool.fileno()——那会把还在内存里的小 spool 强制落盘
+        if hasattr(os, "sendfile") and getattr(spool, "_rolled", False):
+            try:
+                in_fd = spool.fileno()
+                size = os.fstat(in_fd).st_size
+                off = 0
+                while off < size:
+                    sent = os.sendfile(fd, in_fd, off, size - off)
+                    if sent == 0:
+                        break
+                    off += sent
+                if off == size:
+                    os.close(fd)
+                    os.replace(tmp, dst_path)
+                    return
+                os.lseek(fd, 0, os.SEEK_SET)
+                os.ftruncate(fd, 0)
+                spool.seek(0)
+            except OSError:
+                os.lseek(fd, 0, os.SEEK_SET)
+                os.ftruncate(fd, 0)
+                spool.seek(0)  # sendfile 不可用：退回用户态拷贝
+        with os.fdopen(fd, "wb") as out:
+            shutil.copyfileobj(spool, out, 1 << 20)
+        os.replace(tmp, dst_path)
+    except Exception:
+        try:
+            os.remove(tmp)
+        except OSError:
+            pass
+        raise
+
+
+def _gen_thumb(src_path: str, sha: str, thumb_dir: str | None = None) \
+        -> tuple[int | None, int | None, str | None, "PILImage.Image | None"]:
+    """
+    返回 (width, height, thumb_path, small_im)；失败返回 4 个 None。
+    small_im 是 ≤512px 的 RGB 解码结果，留给 embedding/打标签复用——
+    CLIP 输入只有 224px，用它代替重开原图不损精度，却把同一次上传
+    的 JPEG 解码从三遍缩到一遍。
+    线程池里调用时传 thumb_dir（worker 线程没有 app 上下文）。
+    """
     try:
+        if thumb_dir is None:
+            thumb_dir = current_app.config["THUMB_DIR"]
         with PILImage.open(src_path) as im:
             w, h = im.size
-            im.thumbnail((512, 512))
-            tdir = os.path.join(current_app.config["THUMB_DIR"], sha[:2], sha[2:4])
+            tdir = os.path.join(thumb_dir, sha[:2], sha[2:4])
             os.makedirs(tdir, exist_ok=True)
             tpath = os.path.join(tdir, f"{sha}.jpg")
-            im.convert("RGB").save(tpath, "JPEG", quality=85)
-            return w, h, tpath
+
+            # 原图本来就是 ≤512px 的 JPEG（手机截图等常见情形）：缩略图
+            # 就是它自己，硬链接（同盘零字节零拷贝）失败再退 copyfile，
+            # 免掉整个重编码（还躲过 quality=85 的二次劣化）
+            if im.format == "JPEG" and max(w, h) <= 512:
+                if not os.path.exists(tpath):
+                    try:
+                        os.link(src_path, tpath)
+                    except OSError:
+                        shutil.copyfile(src_path, tpath)
+                # embedding/打标签仍要解码结果；本来就是 RGB 时不再
+                # convert 复制一份整幅 raster（load 让像素在 with 退出后仍可用）
+                if im.mode == "RGB":
+                    im.load()
+                    small = im
+                else:
+                    small = im.convert("RGB")
+                return w, h, tpath, small
+
+            # JPEG 走 libjpeg 的 1/2、1/4、1/8 缩放解码：24MP 原图不用
+            # 全量 IDCT 再缩，解码耗时和峰值内存都省一个数量级
+            if im.format == "JPEG":
+                im.draft("RGB", (512, 512))
+            # BILINEAR 对 512px 缩略图画质足够，比默认 BICUBIC 少一半
+            # 卷积核开销；reducing_gap 先用整数倍 reduce 粗缩再精采样
+            im.thumbnail((512, 512), resample=PILImage.BILINEAR,
+                         reducing_gap=2.0)
+            # thumbnail 已解码；RGB 原图直接用，免一次整幅 convert 复制
+            small = im if im.mode == "RGB" else im.convert("RGB")
+            # progressive/optimize 关掉、色度 4:2:0：libjpeg 少一趟全图
+            # 扫描，编码明显更快；512px 缩略图上画质差异肉眼难辨
+            small.save(tpath, "JPEG", quality=85,
+                       progressive=False, optimize=False, subsampling=2)
+            return w, h, tpath, small
     except Exception:
-        return None, None, None
+        return None, None, None, None
 
 
-def _upsert_embedding_and_index(image_id: int, img_path: str) -> None:
+# “还没查过”哨兵：区分调用方已确认不存在（传 None）和没查（不传）
+_UNSET = object()
+
+
+def _probe_existing(image_id: int):
     """
-    若 Embedding 缺失则写入；然后追加到 FAISS 索引，并立刻持久化到磁盘。
+    重复图路径上的存在性预取：一条 outerjoin 同时拿回 Embedding 行
+    和 OcrText 有无，代替 _collect_embedding/_collect_ocr 各自的
+    session.get（每个重复件省一次往返）。失败返回 (未查, 未查)。
     """
-    vec = None
     try:
-        has_vec = db.session.get(Embedding, image_id)
-        if has_vec is None:
-            vec = EMB.encode_image(img_path)  # float32、单位向量
-            model_name = current_app.config.get("EMBED_MODEL", "clip-ViT-B-32")
-            db.session.add(Embedding(
-                image_id=image_id,
-                model_name=model_name,
-                dim=int(len(vec)),
-                vector_blob=vec.astype("float32").tobytes(),
-            ))
-            db.session.commit()
-        else:
-            try:
-                vec = np.frombuffer(has_vec.vector_blob, dtype="float32")
-            except Exception:
-                vec = EMB.encode_image(img_path)
+        emb_rec, ocr_id = db.session.execute(
+            select(Embedding, OcrText.image_id)
+            .select_from(ImageModel)
+            .outerjoin(Embedding, Embedding.image_id == ImageModel.id)
+            .outerjoin(OcrText, OcrText.image_id == ImageModel.id)
+            .where(ImageModel.id == image_id)
+        ).one()
+        return emb_rec, (ocr_id is not None)
     except Exception:
         db.session.rollback()
+        return _UNSET, _UNSET
+
+
+def _collect_embedding(image_id: int, img_path: str, pending: list,
+                       img=None, rec=_UNSET) -> None:
+    """
+    攒批版的向量入库：已有 Embedding 的直接取回向量，没有的只记下
+    来源（优先用已解码的 ≤512px 小图 img，免得 flush 时再开文件；
+    没有就记路径），统一由请求末尾的 _flush_embeddings 一次批量
+    前向 + 一次 FAISS 追加处理。pending 元素为 (id, 路径或图像, 向量)。
+    rec 可传入预取好的 Embedding 行（None 表示已确认不存在），
+    新上传/已预取时不再发 session.get。
+    """
+    if rec is _UNSET:
         try:
             rec = db.session.get(Embedding, image_id)
-            if rec is not None:
-                vec = np.frombuffer(rec.vector_blob, dtype="float32")
         except Exception:
-            vec = None
+            db.session.rollback()
+            rec = None
+    if rec is not None:
+        try:
+            pending.append((image_id, None, rec.vector()))
+            return
+        except Exception:
+            pass
+    pending.append((image_id, img if img is not None else img_path, None))
 
-    # 加入 FAISS（允许重复 add）
-    try:
-        fs = current_app.extensions.get("faiss_store")
-        if fs is not None and vec is not None:
-            ids = np.array([int(image_id)], dtype=np.int64)
-            fs.add(ids, vec.reshape(1, -1).astype("float32"))
-            # 立即持久化
+
+def _embedding_row(image_id: int, vec: np.ndarray, model_name: str,
+                   store_int8: bool) -> Embedding:
+    """
+    组装待入库的 Embedding 行。EMBED_STORE_INT8=1 时按 max-abs 缩放
+    量化成 int8（blob 体积 1/4），vector_scale 存反量化系数；否则
+    沿用 float32 + vector_scale=NULL 的老格式。读取统一走
+    Embedding.vector()，两种行混存没问题。
+    """
+    vec = vec.astype("float32", copy=False)
+    if store_int8:
+        scale = float(np.max(np.abs(vec))) if vec.size else 0.0
+        if scale > 0.0:
+            q = np.clip(np.rint(vec * (127.0 / scale)),
+                        -127, 127).astype(np.int8)
+            return Embedding(image_id=image_id, model_name=model_name,
+                             dim=int(vec.size), vector_blob=q.tobytes(),
+                             vector_scale=scale)
+        # 全零向量量化不了，照旧存 float32
+    return Embedding(image_id=image_id, model_name=model_name,
+                     dim=int(vec.size), vector_blob=vec.tobytes(),
+                     vector_scale=None)
+
+
+def _flush_embeddings(pending: list) -> None:
+    """
+    批量收尾：缺向量的来源（路径或已解码小图）合成一次 encode_images
+    前向；新向量批量 bulk_save_objects 入库；新旧向量合成一次 fs.add
+    （内部只持久化一次索引，不再每张图序列化一遍）。失败不阻断主流程。
+    """
+    if not pending:
+        return
+    to_encode = [(iid, src) for iid, src, v in pending
+                 if v is None and src is not None]
+    ready: dict[int, np.ndarray] = {iid: v for iid, _, v in pending if v is not None}
+
+    if to_encode:
+        mat = None
+        try:
+            mat = EMB.encode_images(
+                [src for _, src in to_encode],
+                batch_size=int(current_app.config.get("EMBED_BATCH_SIZE", 32)))
+        except Exception:
+            pass  # 批里混进坏图会整批失败，下面逐张兜底
+        if mat is not None and len(mat) == len(to_encode):
+            encoded = list(zip((iid for iid, _ in to_encode), mat))
+        else:
+            encoded = []
+            for iid, src in to_encode:
+                try:
+                    encoded.append((iid, EMB.encode_image(src)
+                                    if isinstance(src, str)
+                                    else EMB.encode_image_obj(src)))
+                except Exception:
+                    continue
+        if encoded:
+            model_name = current_app.config.get("EMBED_MODEL", "clip-ViT-B-32")
+            store_int8 = bool(current_app.config.get("EMBED_STORE_INT8"))
             try:
-                if hasattr(fs, "save"):
-                    fs.save()
-                elif hasattr(fs, "write_index"):
-                    fs.write_index()
+                db.session.bulk_save_objects([
+                    _embedding_row(iid, vec, model_name, store_int8)
+                    for iid, vec in encoded
+                ])
+                db.session.commit()
             except Exception:
-                pass
+                db.session.rollback()
+            ready.update(encoded)
+
+    # 加入 FAISS（整批一次 add，add 内部自会 save）。重复上传的 id
+    # 先过滤掉：IDMap2 对重复 id 会默默追加重复向量
+    try:
+        from .. import get_faiss_store
+        fs = get_faiss_store(current_app)
+        if fs is not None and ready:
+            ids = np.fromiter(ready.keys(), dtype=np.int64, count=len(ready))
+            mat = np.stack([v.astype("float32", copy=False)
+                            for v in ready.values()])
+            if hasattr(fs, "filter_new"):
+                keep = fs.filter_new(ids)
+                ids, mat = ids[keep], mat[keep]
+            if ids.size:
+                fs.add(ids, mat)
     except Exception:
         pass  # 索引失败不阻断主流程
 
 
-def _upsert_ocr(image_id: int, img_path: str) -> None:
-    """若 OCR 文本缺失则识别并入库。失败静默跳过。"""
-    try:
-        has_ocr = db.session.get(OcrText, image_id)
-        if has_ocr is None:
-            txt = OCR.extract_text(img_path) or ""
-            db.session.add(OcrText(image_id=image_id, text=txt))
-            db.session.commit()
-    except Exception:
-        db.session.rollback()
+def _collect_ocr(image_id: int, img_path: str, ocr_rows: dict[int, str],
+                 has_ocr=_UNSET, defer: list | None = None) -> None:
+    """
+    OCR 文本缺失时识别并攒进 ocr_rows（按 image_id 去重，同批重复文件
+    只算一次），由 _flush_rows 统一 bulk 入库。识别失败静默跳过。
+    has_ocr 可传入预取好的存在性（新上传传 False 免查）；
+    传 defer（UPLOAD_ASYNC 模式）时只记 (id, path)，识别挪去后台线程。
+    """
+    if image_id in ocr_rows:
+        return
+    if has_ocr is _UNSET:
+        try:
+            has_ocr = db.session.get(OcrText, image_id) is not None
+        except Exception:
+            db.session.rollback()
+            return
+    if has_ocr is False:
+        if defer is not None:
+            defer.append((image_id, img_path))
+            return
+        try:
+            ocr_rows[image_id] = OCR.extract_text(img_path) or ""
+        except Exception:
+            pass
 
 
-def _audit(user_id: int | None, image_id: int, duplicate: bool, extra: str | None = None) -> None:
+def _audit(user_id: int | None, image_id: int, duplicate: bool,
+           audit_rows: list[dict], extra: str | None = None) -> None:
     """
-    记录审计日志；extra 传入形如 '"auto_tag":"cat"' 的 key-value 片段（不含最外层花括号）。
+    审计日志只攒 dict 不写库；extra 传入形如 '"auto_tag":"cat"' 的
+    key-value 片段（不含最外层花括号）。整批由 _flush_rows 一次插入。
+    """
+    base = '{"duplicate": true}' if duplicate else '{"duplicate": false}'
+    if extra:
+        # base[:-1] 去掉末尾 '}'，然后追加 , <extra> 再补回 '}'。
+        extra_json = base[:-1] + f", {extra}}}"
+    else:
+        extra_json = base
+
+    audit_rows.append(dict(
+        user_id=user_id,
+        action="upload",
+        target_type="image",
+        target_id=image_id,
+        ip=request.remote_addr,
+        ua=request.headers.get("User-Agent"),
+        extra_json=extra_json,
+    ))
+
+
+def _flush_rows(ocr_rows: dict[int, str], audit_rows: list[dict],
+                tag_rows: list[dict]) -> None:
+    """
+    循环里攒下来的 OCR/审计/标签行收尾时 bulk 插入：每个上传批
+    2~3 次 COMMIT（原来是每张图 4+ 次往返 + fsync）。标签单独提交，
+    uq_image_tag 冲突只丢标签，不连累其它行。
     """
     try:
-        base = '{"duplicate": true}' if duplicate else '{"duplicate": false}'
-        if extra:
-            # base[:-1] 去掉末尾 '}'，然后追加 , <extra> 再补回 '}'。
-            # 注意：f-string 内要输出字面量 '}' 必须写成 '}}'
-            extra_json = base[:-1] + f", {extra}}}"
-        else:
-            extra_json = base
-
-        db.session.add(AuditLog(
-            user_id=user_id,
-            action="upload",
-            target_type="image",
-            target_id=image_id,
-            ip=request.remote_addr,
-            ua=request.headers.get("User-Agent"),
-            extra_json=extra_json,
-        ))
+        if ocr_rows:
+            db.session.bulk_insert_mappings(
+                OcrText,
+                [{"image_id": iid, "text": txt} for iid, txt in ocr_rows.items()])
+        if audit_rows:
+            db.session.bulk_insert_mappings(AuditLog, audit_rows)
+        # 同一事务顺带提交 _auto_tag 留在 session 里的 category 变更
         db.session.commit()
     except Exception:
         db.session.rollback()
 
+    if tag_rows:
+        try:
+            from ..models import ImageTag
+            dedup = {(r["image_id"], r["tag"]): r for r in tag_rows}
+            db.session.bulk_insert_mappings(ImageTag, list(dedup.values()))
+            db.session.commit()
+        except Exception:
+            db.session.rollback()  # 重复标签等冲突：保持老行为静默丢弃
+
 
-def _auto_tag(image_obj: ImageModel, force: bool = False) -> str | None:
+def _auto_tag(image_obj: ImageModel, force: bool = False, img=None,
+              tag_rows: list[dict] | None = None) -> str | None:
     """
     上传即打标签：
       - category 为空时写入主标签；force=True 时覆盖；
-      - 若存在 ImageTag 表，写入多标签+分数；
+      - 多标签+分数只攒进 tag_rows，由 _flush_rows 统一插入；
+      - 传入 img（缩略图阶段的解码结果）时免去重开原图；
       - 返回实际写入的主标签（无变更则 None）。
+    category 改动留在 session 里，随批次收尾的 commit 一起落库。
     """
     try:
-        res = AT.predict_labels(image_obj.path, labels=None, top_k=3, threshold=0.30)
+        if img is not None:
+            res = AT.predict_labels_image(img, labels=None, top_k=3, threshold=0.30)
+        else:
+            res = AT.predict_labels(image_obj.path, labels=None, top_k=3, threshold=0.30)
         # 统一到规范名（如果 autotag 提供了 to_canonical）
         new_cat = AT.to_canonical(res.primary) if hasattr(AT, "to_canonical") else (res.primary or "others")
         if not new_cat:
@@ -151,17 +405,11 @@ def _auto_tag(image_obj: ImageModel, force: bool = False) -> str | None:
             return None
 
         image_obj.category = new_cat
-        db.session.commit()
 
-        # 可选：多标签（如果定义了 ImageTag）
-        try:
-            from ..models import ImageTag  # 没这表会异常，直接忽略
+        if tag_rows is not None:
             for lab in res.labels:
-                sc = float(res.scores.get(lab, 0.0))
-                db.session.add(ImageTag(image_id=image_obj.id, tag=lab, score=sc))
-            db.session.commit()
-        except Exception:
-            db.session.rollback()
+                tag_rows.append({"image_id": image_obj.id, "tag": lab,
+                                 "score": float(res.scores.get(lab, 0.0))})
 
         return new_cat
     except Exception:
@@ -169,6 +417,53 @@ def _auto_tag(image_obj: ImageModel, force: bool = False) -> str | None:
         return None
 
 
+# ---- UPLOAD_ASYNC=1：embedding/OCR 挪到后台线程，响应只等落盘 + 行插入 ----
+# 单 worker 串行消费（同 images.py 的删除队列模式）：模型本身就被 GIL/
+# 显存限制成串行，多 worker 只会互相抢
+_bg_q: "queue.Queue" = queue.Queue()
+_bg_worker: threading.Thread | None = None
+_bg_lock = threading.Lock()
+
+
+def _bg_process(app, pending_emb: list, ocr_jobs: list) -> None:
+    """后台批处理：OCR 识别 + bulk 入库，然后批量向量化 + FAISS 追加。"""
+    with app.app_context():
+        try:
+            rows: dict[int, str] = {}
+            for iid, path in ocr_jobs:
+                _collect_ocr(iid, path, rows)
+            if rows:
+                try:
+                    db.session.bulk_insert_mappings(
+                        OcrText,
+                        [{"image_id": iid, "text": txt} for iid, txt in rows.items()])
+                    db.session.commit()
+                except Exception:
+                    db.session.rollback()
+            _flush_embeddings(pending_emb)
+        except Exception:
+            pass  # 后台任务失败不抛；可用 reindex/rebuild 端点补
+
+
+def _bg_loop():
+    while True:
+        app, pending_emb, ocr_jobs = _bg_q.get()
+        try:
+            _bg_process(app, pending_emb, ocr_jobs)
+        finally:
+            _bg_q.task_done()
+
+
+def _queue_bg(app, pending_emb: list, ocr_jobs: list) -> None:
+    global _bg_worker
+    _bg_q.put((app, pending_emb, ocr_jobs))
+    if _bg_worker is None:
+        with _bg_lock:
+            if _bg_worker is None:
+                _bg_worker = threading.Thread(target=_bg_loop, daemon=True)
+                _bg_worker.start()
+
+
 # ---------------- route ----------------
 @bp.post("/api/upload")
 @jwt_required(optional=True)
@@ -190,112 +485,211 @@ def upload():
     user_id = get_jwt_identity()
     force_tag = (request.args.get("force_tag") or "0").lower() in ("1", "true", "yes")
     saved = []
-
-    for file in files:
+    # 需要算向量/补索引的图先攒着，循环结束后一次批量前向 + 一次 FAISS 追加；
+    # OCR/审计/标签行同样攒批，收尾 bulk 插入
+    pending_emb: list = []
+    ocr_rows: dict[int, str] = {}
+    audit_rows: list[dict] = []
+    tag_rows: list[dict] = []
+    # UPLOAD_ASYNC=1：OCR/向量化出队到后台线程，HTTP 只等「落盘+行插入」
+    async_mode = bool(current_app.config.get("UPLOAD_ASYNC"))
+    ocr_defer: list[tuple[int, str]] = []
+
+    upload_dir = current_app.config["UPLOAD_DIR"]
+    thumb_dir = current_app.config["THUMB_DIR"]
+    workers = min(8, os.cpu_count() or 1)
+
+    def _ingest_io(file) -> dict:
+        """阶段一（可并行，不碰 DB）：读流进 spool + 同趟算 sha256。"""
         if not file or not file.filename:
-            saved.append({"error": "empty filename"})
-            continue
-
-        tmp_fd, tmp_path = tempfile.mkstemp(
-            prefix="ing_", suffix="_upload", dir=current_app.config["UPLOAD_DIR"]
-        )
-        os.close(tmp_fd)
-
+            return {"error": "empty filename"}
+        # ≤8MiB 先留在内存里；只有确认要保存（非重复）时才真正落盘
+        spool = tempfile.SpooledTemporaryFile(max_size=8 << 20, dir=upload_dir)
         try:
-            file.save(tmp_path)
-
-            # 内容寻址
-            sha = _sha256_file(tmp_path)
-            subdir = os.path.join(current_app.config["UPLOAD_DIR"], sha[:2], sha[2:4])
-            os.makedirs(subdir, exist_ok=True)
-            dst_path = os.path.join(subdir, sha)
+            sha = _spool_and_hash(file, spool)
+        except Exception as e:
+            spool.close()
+            return {"error": str(e)}
+        return {"filename": file.filename, "sha": sha, "spool": spool}
+
+    def _persist_io(e: dict) -> None:
+        """阶段二（可并行，不碰 DB）：content-addressed 落盘 + 缩略图。"""
+        sha = e["sha"]
+        subdir = os.path.join(upload_dir, sha[:2], sha[2:4])
+        os.makedirs(subdir, exist_ok=True)
+        dst_path = os.path.join(subdir, sha)
+        try:
+            _materialize_spool(e["spool"], dst_path)
+            e["path"] = dst_path
+            e["w"], e["h"], e["tpath"], e["small"] = _gen_thumb(
+                dst_path, sha, thumb_dir=thumb_dir)
+        except Exception as err:
+            e["error"] = str(err)
+
+    # 读流/哈希/PIL 编解码都释放 GIL，多文件请求这两段 I/O 真并行；
+    # DB 写仍在主线程按请求顺序串行（session 不跨线程）
+    if len(files) > 1:
+        with ThreadPoolExecutor(max_workers=workers) as ex:
+            entries = list(ex.map(_ingest_io, files))
+    else:
+        entries = [_ingest_io(f) for f in files]
+
+    # 去重检查合并成一条 IN 查询（原来每个文件各查一次）
+    shas = {e["sha"] for e in entries if "sha" in e}
+    existed_by_sha: dict[str, ImageModel] = {}
+    if shas:
+        try:
+            existed_by_sha = {
+                im.sha256: im
+                for im in ImageModel.query.filter(ImageModel.sha256.in_(shas)).all()
+            }
+        except Exception:
+            db.session.rollback()
 
-            existed: ImageModel | None = ImageModel.query.filter_by(sha256=sha).first()
+    # 只有「全新」或「记录在文件丢」的条目需要落盘；同内容只落一次
+    need_disk, seen = [], set()
+    for e in entries:
+        if "sha" not in e or e["sha"] in seen:
+            continue
+        ex_row = existed_by_sha.get(e["sha"])
+        if ex_row is not None and os.path.exists(ex_row.path):
+            continue
+        seen.add(e["sha"])
+        need_disk.append(e)
+    if len(need_disk) > 1:
+        with ThreadPoolExecutor(max_workers=workers) as ex:
+            list(ex.map(_persist_io, need_disk))
+    else:
+        for e in need_disk:
+            _persist_io(e)
+    if need_disk:
+        # /view /thumb 的 exists 负缓存可能还记着这些路径的 404
+        # （同内容重传恰好会落回同一 sha 路径），落盘后失效掉
+        from ..paths import invalidate_exists_cache
+        invalidate_exists_cache()
+
+    # 阶段三（串行）：DB 写入 + 攒批收集，保持请求顺序
+    for e in entries:
+        spool = e.get("spool")
+        try:
+            if "error" in e:
+                saved.append({"error": e["error"]})
+                continue
+            sha = e["sha"]
+            existed: ImageModel | None = existed_by_sha.get(sha)
 
             # ===== 已存在且文件在磁盘上：做补全并返回 =====
             if existed and os.path.exists(existed.path):
-                _upsert_embedding_and_index(existed.id, existed.path)
-                _upsert_ocr(existed.id, existed.path)
-                tag_written = _auto_tag(existed, force=force_tag)
-                _audit(user_id, existed.id, duplicate=True,
+                # 一条 outerjoin 预取向量/OCR 存在性，代替两次 session.get
+                emb_rec, has_ocr = _probe_existing(existed.id)
+                _collect_embedding(existed.id, existed.path, pending_emb, rec=emb_rec)
+                _collect_ocr(existed.id, existed.path, ocr_rows, has_ocr=has_ocr,
+                             defer=ocr_defer if async_mode else None)
+                tag_written = _auto_tag(existed, force=force_tag, tag_rows=tag_rows)
+                _audit(user_id, existed.id, duplicate=True, audit_rows=audit_rows,
                        extra=(f'"auto_tag":"{tag_written}"' if tag_written else None))
                 saved.append({"image_id": existed.id, "duplicate": True, "auto_tag": tag_written})
                 continue
 
-            # ===== DB 里有记录但文件丢失：修复路径并补全 =====
-            if existed and not os.path.exists(existed.path):
-                os.replace(tmp_path, dst_path)
-                target_path = dst_path
+            target_path = e.get("path")
+            if target_path is None:
+                saved.append({"error": "persist failed"})
+                continue
+            w, h = e.get("w"), e.get("h")
+            tpath, small_im = e.get("tpath"), e.get("small")
 
-                w, h, tpath = _gen_thumb(target_path, sha)
+            # ===== DB 里有记录但文件丢失：修复路径并补全 =====
+            if existed:
                 try:
-                    existed.path = target_path
-                    existed.thumb_path = existed.thumb_path or tpath
-                    existed.width = existed.width or w
-                    existed.height = existed.height or h
-                    existed.size_bytes = os.path.getsize(target_path)
-                    existed.mime = existed.mime or (guess_type(file.filename)[0] or "application/octet-stream")
-                    db.session.commit()
+                    # savepoint 隔离：这一条修复失败只回滚它自己，
+                    # COMMIT（连带 fsync）留到批末统一做一次
+                    with db.session.begin_nested():
+                        existed.path = target_path
+                        existed.thumb_path = existed.thumb_path or tpath
+                        existed.width = existed.width or w
+                        existed.height = existed.height or h
+                        existed.megapixels = existed.megapixels or \
+                            ((existed.width or 0) * (existed.height or 0))
+                        existed.size_bytes = os.path.getsize(target_path)
+                        existed.mime = existed.mime or (guess_type(e["filename"])[0] or "application/octet-stream")
                 except Exception:
-                    db.session.rollback()
+                    pass
 
-                _upsert_embedding_and_index(existed.id, existed.path)
-                _upsert_ocr(existed.id, existed.path)
-                tag_written = _auto_tag(existed, force=force_tag)
-                _audit(user_id, existed.id, duplicate=False,
+                emb_rec, has_ocr = _probe_existing(existed.id)
+                _collect_embedding(existed.id, existed.path, pending_emb,
+                                   img=small_im, rec=emb_rec)
+                _collect_ocr(existed.id, existed.path, ocr_rows, has_ocr=has_ocr,
+                             defer=ocr_defer if async_mode else None)
+                tag_written = _auto_tag(existed, force=force_tag, img=small_im,
+                                        tag_rows=tag_rows)
+                _audit(user_id, existed.id, duplicate=False, audit_rows=audit_rows,
                        extra=(f'"auto_tag":"{tag_written}"' if tag_written else None))
                 saved.append({"image_id": existed.id, "duplicate": False, "auto_tag": tag_written})
                 continue
 
             # ===== 全新图片 =====
-            os.replace(tmp_path, dst_path)
-            target_path = dst_path
-
-            width, height, thumb_path = _gen_thumb(target_path, sha)
             size_bytes = os.path.getsize(target_path)
-            mime = guess_type(file.filename)[0] or "application/octet-stream"
+            mime = guess_type(e["filename"])[0] or "application/octet-stream"
 
             image = ImageModel(
                 user_id=user_id,
                 sha256=sha,
                 path=target_path,
-                thumb_path=thumb_path,
-                width=width,
-                height=height,
+                thumb_path=tpath,
+                width=w,
+                height=h,
+                megapixels=(w or 0) * (h or 0),
                 size_bytes=size_bytes,
                 mime=mime,
             )
             try:
-                db.session.add(image)
-                db.session.commit()
-            except Exception as e:
-                db.session.rollback()
-                saved.append({"error": f"db.insert image failed: {e}"})
+                # flush 拿 image.id 即可，COMMIT 留到批末的 _flush_rows
+                # 一次做完（N 个文件 ~6N 次 fsync → 每批 2~3 次）；
+                # savepoint 保证坏文件只回滚自己的行
+                with db.session.begin_nested():
+                    db.session.add(image)
+                    db.session.flush()
+            except Exception as err:
+                saved.append({"error": f"db.insert image failed: {err}"})
                 try:
                     if os.path.exists(target_path):
                         os.remove(target_path)
-                    if thumb_path and os.path.exists(thumb_path):
-                        os.remove(thumb_path)
+                    if tpath and os.path.exists(tpath):
+                        os.remove(tpath)
                 except Exception:
                     pass
                 continue
+            # 同批里内容相同的后续文件走上面的重复分支
+            existed_by_sha[sha] = image
 
-            _audit(user_id, image.id, duplicate=False)
+            _audit(user_id, image.id, duplicate=False, audit_rows=audit_rows)
 
-            _upsert_embedding_and_index(image.id, image.path)
-            _upsert_ocr(image.id, image.path)
-            tag_written = _auto_tag(image, force=force_tag)
+            # 刚 INSERT 的图必然没有向量/OCR 行，存在性检查直接免掉
+            _collect_embedding(image.id, image.path, pending_emb,
+                               img=small_im, rec=None)
+            _collect_ocr(image.id, image.path, ocr_rows, has_ocr=False,
+                         defer=ocr_defer if async_mode else None)
+            tag_written = _auto_tag(image, force=force_tag, img=small_im,
+                                    tag_rows=tag_rows)
 
             saved.append({"image_id": image.id, "duplicate": False, "auto_tag": tag_written})
 
-        except Exception as e:
-            db.session.rollback()
-            saved.append({"error": str(e)})
+        except Exception as e2:
+            # 不整体 rollback：批内 DB 写都包在 savepoint/自带兜底里，
+            # 这里整体回滚反而会把前面文件还没 COMMIT 的行一起丢掉
+            saved.append({"error": str(e2)})
         finally:
-            try:
-                if os.path.exists(tmp_path):
-                    os.remove(tmp_path)
-            except Exception:
-                pass
+            if spool is not None:
+                spool.close()  # 内存态直接释放；已 rollover 的由 tempfile 删文件
+
+    _flush_rows(ocr_rows, audit_rows, tag_rows)
+
+    if async_mode and (pending_emb or ocr_defer):
+        # 审计/标签/类别已入库；重活（CLIP 前向 + OCR）出队后台，
+        # 客户端轮询 /api/images/<id> 看补全进度
+        _queue_bg(current_app._get_current_object(), pending_emb, ocr_defer)
+        return jsonify(saved=saved, processing=True), 202
+
+    _flush_embeddings(pending_emb)
 
     return jsonify(saved=saved)
@@ -1,6 +1,8 @@
 # app/faiss_store.py
 from __future__ import annotations
+import atexit
 import os
+import threading
 import numpy as np
 
 try:
@@ -21,15 +23,37 @@ class FaissStore:
       - load()                         # load from disk if exists
       - ntotal() -> int
     """
-    def __init__(self, dim: int, index_path: str, metric: str = "IP"):
+    def __init__(self, dim: int, index_path: str, metric: str = "IP",
+                 index_factory_str: str | None = None,
+                 nprobe: int | None = None, autosave: bool = True,
+                 efsearch: int | None = None):
         self.dim = int(dim)
         self.index_path = os.path.abspath(index_path)
         self.metric = metric.upper()  # "IP" or "L2"
+        # 例如 "IVF1,Flat"（开发期小库走穷举 IVF，reopen 时可 mmap）；
+        # None 表示沿用 IndexFlat 老行为
+        self.index_factory_str = index_factory_str
+        # IVF 检索时探多少个倒排桶；非 IVF 索引忽略
+        self.nprobe = nprobe
+        # HNSW 检索时的候选队列长度（factory 串用 HNSW32 之类时生效）
+        self.efsearch = efsearch
+        # autosave=False：add 后不排防抖落盘，完全交调用方掌控 save()
+        # 时机（批量导入脚本收尾写一次就够）
+        self.autosave = autosave
         self._index = None  # faiss.Index
         self._idmap = None  # faiss.IndexIDMap2
+        # 防抖落盘：write_index 每次都整份序列化，并发上传时合并写
+        self._save_lock = threading.Lock()
+        self._save_timer: threading.Timer | None = None
+        # 已入索引的外部 id 集合，惰性构建（首次用到时从 id_map 全量
+        # 拉取，之后随 add/rebuild 增量维护），用于挡重复 add
+        self._known_ids: set[int] | None = None
 
         os.makedirs(os.path.dirname(self.index_path), exist_ok=True)
         self._load_if_exists()
+        self._apply_nprobe()
+        # 进程退出时把防抖窗口里还没落盘的增量写掉，不丢最后一批 add
+        atexit.register(self._flush_on_exit)
 
     # 兼容旧名字
     def write_index(self):  # alias
@@ -38,18 +62,101 @@ class FaissStore:
     def save(self):
         if self._idmap is None:
             return
+        with self._save_lock:
+            if self._save_timer is not None:
+                self._save_timer.cancel()
+                self._save_timer = None
         faiss.write_index(self._idmap, self.index_path)
 
-    def load(self):
+    def schedule_save(self, delay: float = 2.0):
+        """
+        延迟 delay 秒落盘，窗口内的再次调用合并成一次 write_index：
+        连续几个上传请求各 add 一批向量时，整份索引只序列化一遍，
+        而不是每个请求写一次。要立即持久化（脚本收尾等）仍调 save()。
+        """
+        with self._save_lock:
+            if self._save_timer is not None:
+                self._save_timer.cancel()
+            t = threading.Timer(delay, self._save_quietly)
+            t.daemon = True
+            self._save_timer = t
+            t.start()
+
+    # 语义化别名：调用方表达“索引变脏了，找机会写盘”
+    def mark_dirty(self):
+        self.schedule_save()
+
+    def _save_quietly(self):
+        try:
+            self.save()
+        except Exception:
+            pass  # 后台落盘失败不往无人接的线程里抛
+
+    def _flush_on_exit(self):
+        with self._save_lock:
+            pending = self._save_timer is not None
+        if pending:
+            self._save_quietly()
+
+    def load(self, mmap: bool = True):
         if faiss is None:
             return
         if self.index_path and os.path.exists(self.index_path):
-            idx = faiss.read_index(self.index_path)
+            idx = self._read_index(mmap=mmap)
             # 统一成 IDMap
             if not isinstance(idx, faiss.IndexIDMap):
                 idx = faiss.IndexIDMap(idx)
             self.index = idx
 
+    def _read_index(self, mmap: bool = False):
+        """
+        读索引；mmap=True 时用 IO_FLAG_MMAP|IO_FLAG_READ_ONLY，让常驻内存
+        只占热页而不是整个索引（多 worker 部署关键）。注意只有 IVF/HNSW 等
+        类型支持 mmap，IndexFlat 等不支持时回退整读。
+        """
+        if mmap:
+            try:
+                flags = faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY
+                return faiss.read_index(self.index_path, flags)
+            except Exception:
+                pass  # 不支持 mmap 的索引类型：退回整读
+        return faiss.read_index(self.index_path)
+
+    def prewarm(self):
+        """
+        顺序预读索引文件，把 mmap 页提前拉进 page cache（放后台线程里调，
+        避免首个查询把 page fault 延迟都吃在脸上）。预读完把访问模式
+        改建议成 RANDOM（检索摸倒排表本来就是随机访问，关掉顺序预读
+        窗口省得内核读多余页），再发一次假查询把 faiss 自身的惰性
+        结构也热好。失败静默跳过。
+        """
+        path = self.index_path
+        if not path or not os.path.isfile(path):
+            return
+        try:
+            fd = os.open(path, os.O_RDONLY)
+        except OSError:
+            return
+        try:
+            size = os.fstat(fd).st_size
+            if hasattr(os, "posix_fadvise"):
+                os.posix_fadvise(fd, 0, size, os.POSIX_FADV_WILLNEED)
+            # 再按 4MiB 块读一遍，确保页真正驻留
+            while os.read(fd, 4 * 1024 * 1024):
+                pass
+            if hasattr(os, "posix_fadvise"):
+                os.posix_fadvise(fd, 0, size, os.POSIX_FADV_RANDOM)
+        except OSError:
+            pass
+        finally:
+            os.close(fd)
+        # 假查询：触发量化器/直达表等首次访问才建的内部结构
+        try:
+            if self.ntotal:
+                self.search(np.zeros(self.dim, dtype=np.float32), k=1)
+        except Exception:
+            pass
+
     @property
     def ntotal(self) -> int:
         if self._idmap is None:
@@ -68,21 +175,144 @@ class FaissStore:
         if ids.shape[0] != vecs.shape[0]:
             raise ValueError("ids and vecs must have same length")
 
+        # IVF 之类的索引要先训练；用首批向量就地训练一次
+        if not self._idmap.is_trained:
+            self._idmap.train(vecs)
+
         # 追加
         self._idmap.add_with_ids(vecs, ids)
-        # 立刻持久化，避免进程崩溃丢增量
-        self.save()
+        if self._known_ids is not None:
+            self._known_ids.update(ids.tolist())
+        # 防抖持久化：2 秒窗口内的连续 add 合并成一次整份序列化；
+        # 崩溃最多丢这 2 秒的增量，重传/重建即可补回
+        if self.autosave:
+            self.schedule_save()
 
     def search(self, qvec: np.ndarray, k: int = 12):
+        """
+        返回 (ids, scores) 两个 numpy 数组（已剔除 -1 空位、保持降序）。
+        调用方可整批向量化换算分数，不必逐元素 int()/float()；
+        兼容旧的 [(id, score)] 迭代见 search.py 的 _norm_hits。
+        """
         self._ensure_loaded()
         if self.ntotal == 0:
-            return []
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
         q = np.asarray(qvec, dtype=np.float32).reshape(1, self.dim)
         D, I = self._idmap.search(q, k)
-        # 返回 [(id, score)]
-        return [(int(i), float(d)) for i, d in zip(I[0], D[0]) if i != -1]
+        ids, scores = I[0], D[0]
+        keep = ids != -1
+        return ids[keep], scores[keep].astype(np.float32, copy=False)
+
+    def _apply_nprobe(self):
+        """
+        按索引类型设检索参数：IVF 的 nprobe（探的桶数）、HNSW 的
+        efSearch（候选队列长度），都是召回/速度旋钮。索引类型由
+        factory 串决定（IVF4096,Flat / HNSW32,Flat / IVF1024,PQ64 等），
+        不匹配的参数 extract 失败静默跳过。
+        """
+        if self._idmap is None:
+            return
+        if self.nprobe:
+            try:
+                faiss.extract_index_ivf(self._idmap).nprobe = int(self.nprobe)
+            except Exception:
+                pass
+        if self.efsearch:
+            try:
+                base = faiss.downcast_index(self._idmap.index)
+                base.hnsw.efSearch = int(self.efsearch)
+            except Exception:
+                pass
+
+    def rebuild(self, ids: np.ndarray, vecs: np.ndarray,
+                factory_str: str | None = None) -> int:
+        """
+        全量重建：默认按 nlist ≈ √N 的 IVF 重建（量化后缀沿用当前
+        factory 串），Flat/IVF1 在几十万向量后是 O(N·D) 的线性扫描，
+        换成真 IVF 后每查只摸 nprobe 个桶，检索代价 sub-linear。
+        训练样本随机抽（上限 256k 条足够聚类），建完替换实例内索引
+        并立即落盘。返回重建后的向量数。
+        """
+        ids = np.asarray(ids, dtype=np.int64).reshape(-1)
+        vecs = np.asarray(vecs, dtype=np.float32).reshape(-1, self.dim)
+        n = ids.shape[0]
+        if factory_str is None:
+            quant = "Flat"
+            if self.index_factory_str and "," in self.index_factory_str:
+                quant = self.index_factory_str.split(",", 1)[1]
+            nlist = max(1, int(round(n ** 0.5)))
+            factory_str = f"IVF{nlist},{quant}"
+        metric = (faiss.METRIC_INNER_PRODUCT if self.metric == "IP"
+                  else faiss.METRIC_L2)
+        idmap = faiss.IndexIDMap2(faiss.index_factory(self.dim, factory_str, metric))
+        if n:
+            if not idmap.is_trained:
+                cap = 262144
+                train = vecs
+                if n > cap:
+                    sel = np.random.default_rng(0).choice(n, cap, replace=False)
+                    train = np.ascontiguousarray(vecs[sel])
+                idmap.train(train)
+            idmap.add_with_ids(vecs, ids)
+        with self._save_lock:
+            if self._save_timer is not None:
+                self._save_timer.cancel()
+                self._save_timer = None
+        self._idmap = idmap
+        self.index_factory_str = factory_str
+        self._known_ids = set(ids.tolist())
+        self._apply_nprobe()
+        self.save()
+        return n
+
+    def filter_new(self, ids: np.ndarray) -> np.ndarray:
+        """
+        布尔掩码：ids 中尚未入索引的位置为 True。IndexIDMap2 对重复 id
+        会默默追加重复向量（ntotal 膨胀、同一图在结果里出现两次），
+        调用方 add 前先用这个过滤。id 集合拉取失败时返回全 True，
+        退回以前“允许重复 add”的行为。
+        """
+        ids = np.asarray(ids, dtype=np.int64).reshape(-1)
+        known = self._ids_snapshot()
+        if known is None:
+            return np.ones(ids.shape[0], dtype=bool)
+        return np.fromiter((int(i) not in known for i in ids.tolist()),
+                           dtype=bool, count=ids.shape[0])
+
+    def _ids_snapshot(self) -> set[int] | None:
+        if self._known_ids is None:
+            try:
+                if self.ntotal:
+                    self._known_ids = set(
+                        faiss.vector_to_array(self._idmap.id_map).tolist())
+                else:
+                    self._known_ids = set()
+            except Exception:
+                return None  # 下次再试；本次按“全是新 id”处理
+        return self._known_ids
+
+    def reconstruct(self, ext_id: int) -> np.ndarray:
+        """
+        按外部 id 取回索引里存的向量（IDMap2 自带 id→向量映射）。
+        图已入库时拿这个当查询向量，省掉一次模型前向。
+        IVF 底层第一次要 make_direct_map；量化索引返回的是反量化近似值，
+        对 top-k 检索足够。找不到 / 不支持时抛异常，调用方自行回退。
+        """
+        self._ensure_loaded()
+        try:
+            vec = self._idmap.reconstruct(int(ext_id))
+        except RuntimeError:
+            # IVF 需要 direct map 才能按 id 重建；建一次后重试
+            ivf = faiss.extract_index_ivf(self._idmap)
+            ivf.make_direct_map()
+            vec = self._idmap.reconstruct(int(ext_id))
+        return np.asarray(vec, dtype=np.float32).reshape(self.dim)
 
     def _new_base_index(self):
+        if self.index_factory_str:
+            metric = (faiss.METRIC_INNER_PRODUCT if self.metric == "IP"
+                      else faiss.METRIC_L2)
+            return faiss.index_factory(self.dim, self.index_factory_str, metric)
         if self.metric == "IP":
             base = faiss.IndexFlatIP(self.dim)
         else:
@@ -95,7 +325,7 @@ class FaissStore:
 
     def _load_if_exists(self):
         if os.path.isfile(self.index_path):
-            idx = faiss.read_index(self.index_path)
+            idx = self._read_index(mmap=True)
             # 兼容“裸 base index”或已是 IDMap 的两种情况
             if isinstance(idx, faiss.IndexIDMap2):
                 self._idmap = idx
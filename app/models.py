@@ -31,6 +31,9 @@ class Image(db.Model):
     height = db.Column(db.Integer, nullable=True)
     size_bytes = db.Column(db.Integer, nullable=True)
     mime = db.Column(db.String(64), nullable=True)
+    # width*height 写入时算好存下来：analytics 的像素分桶直接走索引，
+    # 不用每次 dashboard 全表乘法扫描
+    megapixels = db.Column(db.Integer, nullable=True, index=True)
 
     # browsing / filtering
     category = db.Column(db.String(64), index=True, nullable=True, default=None)
@@ -82,7 +85,9 @@ class Image(db.Model):
         }
 
 
-# Composite index to help gallery pagination by category + id
+# Composite index to help gallery pagination by category + id.
+# id ASC 也能被倒序翻页用上（planner 反向扫描即可），不用再建 DESC 变体；
+# /summary 的时间窗过滤走 created_at 列自带的单列索引。
 db.Index("idx_image_category_id", Image.category, Image.id)
 
 
@@ -92,8 +97,19 @@ class Embedding(db.Model):
     image_id = db.Column(db.Integer, db.ForeignKey("image.id"), primary_key=True)
     model_name = db.Column(db.String(128), nullable=False)
     dim = db.Column(db.Integer, nullable=False)
-    # Persist normalized float32 vector; stored as raw bytes
+    # Persist normalized float32 vector; stored as raw bytes.
+    # EMBED_STORE_INT8=1 时改存 int8 量化值（max-abs 缩放），blob 体积
+    # 缩到 1/4；vector_scale 记反量化系数，NULL 表示旧的 float32 行
     vector_blob = db.Column(db.LargeBinary, nullable=False)
+    vector_scale = db.Column(db.Float, nullable=True)
+
+    def vector(self):
+        """解码回 float32 向量（兼容 int8 量化行与旧 float32 行）。"""
+        import numpy as np
+        if self.vector_scale is not None:
+            q = np.frombuffer(self.vector_blob, dtype=np.int8)
+            return (q.astype(np.float32) * (float(self.vector_scale) / 127.0))
+        return np.frombuffer(self.vector_blob, dtype=np.float32)
 
     def __repr__(self) -> str:
         return f"<Embedding image_id={self.image_id} dim={self.dim} model={self.model_name}>"
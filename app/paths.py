@@ -0,0 +1,41 @@
+# app/paths.py
+"""
+sha256 -> 仓储路径的缓存层。
+
+/view /thumb 热点里 _resolve_image_path 每次都要拼路径 + os.path.exists，
+画廊快速滚动时每张缩略图都是好几次 stat。这里把 sha 推导的路径和
+exists 结果都用 lru_cache 存起来（含负缓存：反复 404 的 sha 也不再 stat）。
+文件被删除/新落盘后调用 clear_path_caches() 失效。
+"""
+from __future__ import annotations
+
+import os
+from functools import lru_cache
+
+
+@lru_cache(maxsize=100_000)
+def image_path_for_sha(sha: str, data_dir: str) -> str:
+    return os.path.join(data_dir, "images", sha[:2], sha[2:4], sha)
+
+
+@lru_cache(maxsize=100_000)
+def thumb_path_for_sha(sha: str, data_dir: str) -> str:
+    return os.path.join(data_dir, "thumbs", sha[:2], sha[2:4], f"{sha}.jpg")
+
+
+@lru_cache(maxsize=100_000)
+def path_exists_cached(path: str) -> bool:
+    """os.path.exists 的正/负缓存。"""
+    return os.path.exists(path)
+
+
+def invalidate_exists_cache() -> None:
+    """新文件落盘后只清 exists 正/负缓存。sha→路径推导是纯函数不会过期，
+    不必连带清掉；上传热路径用这个，删除/修复路径仍用 clear_path_caches()。"""
+    path_exists_cached.cache_clear()
+
+
+def clear_path_caches() -> None:
+    image_path_for_sha.cache_clear()
+    thumb_path_for_sha.cache_clear()
+    path_exists_cached.cache_clear()
@@ -133,18 +133,13 @@ class TaggingResult:
     labels: List[str]             # output names (aligned with prefer_plural)
     scores: Dict[str, float]      # scores keyed by canonical names
 
-def score_image(image_path: str, labels: Optional[Iterable[str]] = None) -> Dict[str, float]:
-    """
-    Compute cosine/IP scores for an image against each label prototype.
-    Returns: {canonical_label: score in [-1,1]} (higher is better).
-    """
+def _scores_for_vec(ivec: np.ndarray, labels: Optional[Iterable[str]]) -> Dict[str, float]:
+    """Score a normalized image vector against each label prototype."""
     label_list_in = list(labels) if labels is not None else list(DEFAULT_LABELS)
     label_list = _canonize_list(label_list_in)
     if not label_list:
         raise ValueError("Empty label set for auto-tagging after canonicalization.")
 
-    ivec = EMB.encode_image(image_path)  # normalized (dim,)
-
     protos: List[np.ndarray] = []
     for lbl in label_list:
         pv = _average_text_embedding(prompts_for(lbl))
@@ -154,6 +149,19 @@ def score_image(image_path: str, labels: Optional[Iterable[str]] = None) -> Dict
     scores = P @ ivec             # cosine/IP (both normalized)
     return {label_list[i]: float(scores[i]) for i in range(len(label_list))}
 
+
+def score_image(image_path: str, labels: Optional[Iterable[str]] = None) -> Dict[str, float]:
+    """
+    Compute cosine/IP scores for an image against each label prototype.
+    Returns: {canonical_label: score in [-1,1]} (higher is better).
+    """
+    return _scores_for_vec(EMB.encode_image(image_path), labels)
+
+
+def score_image_obj(img, labels: Optional[Iterable[str]] = None) -> Dict[str, float]:
+    """Same as score_image but for an already-decoded PIL.Image / ndarray."""
+    return _scores_for_vec(EMB.encode_image_obj(img), labels)
+
 def predict_labels(
     image_path: str,
     labels: Optional[Iterable[str]] = None,
@@ -168,6 +176,26 @@ def predict_labels(
     but scores keys always stay canonical/singular for storage.
     """
     scores = score_image(image_path, labels=labels)
+    return _predict_from_scores(scores, top_k, threshold, prefer_plural)
+
+
+def predict_labels_image(
+    img,
+    labels: Optional[Iterable[str]] = None,
+    top_k: int = 3,
+    threshold: float = 0.30,
+    *,
+    prefer_plural: bool = False,
+) -> TaggingResult:
+    """predict_labels for an already-decoded image — callers that decoded
+    once for thumbnail/embedding reuse it here instead of re-reading."""
+    scores = score_image_obj(img, labels=labels)
+    return _predict_from_scores(scores, top_k, threshold, prefer_plural)
+
+
+def _predict_from_scores(
+    scores: Dict[str, float], top_k: int, threshold: float, prefer_plural: bool,
+) -> TaggingResult:
     if not scores:
         raise RuntimeError("No scores computed — empty label set?")
 
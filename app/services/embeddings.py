@@ -88,6 +88,13 @@ def _encode_any(model, payload, normalize: bool = True) -> np.ndarray:
     return _l2_normalize(vec) if normalize else vec
 
 
+def _as_rgb_pil(img) -> Image.Image:
+    """已解码图像统一成 RGB PIL.Image（ndarray 先 fromarray）。"""
+    if not hasattr(img, "mode"):
+        img = Image.fromarray(np.asarray(img))
+    return img if img.mode == "RGB" else img.convert("RGB")
+
+
 def encode_image(image_path: str) -> np.ndarray:
     """
     图像 -> 向量 (float32, L2 归一化)
@@ -99,6 +106,30 @@ def encode_image(image_path: str) -> np.ndarray:
     return _encode_any(model, img, normalize=True)
 
 
+def encode_image_obj(img) -> np.ndarray:
+    """
+    已解码图像（PIL.Image 或 HWC uint8 ndarray）-> 向量。
+    上传链路把同一次解码喂给多个消费方时走这里，不再按路径重读重解。
+    """
+    model, _device = _load_model_cached()
+    return _encode_any(model, _as_rgb_pil(img), normalize=True)
+
+
+def encode_images(images: list, batch_size: int = 16) -> np.ndarray:
+    """
+    多张图 -> (n, dim) 向量矩阵 (float32, L2 归一化)。
+    一次批量前向摊薄模型调用的固定开销（GPU 上尤其明显），
+    供上传接口把整批文件合成单次推理用。
+    列表元素可以是路径，也可以是已解码的 PIL.Image / ndarray 混用。
+    """
+    model, _device = _load_model_cached()
+    imgs = [_ensure_rgb_image(p) if isinstance(p, str) else _as_rgb_pil(p)
+            for p in images]
+    vecs = model.encode(imgs, batch_size=batch_size,
+                        convert_to_numpy=True, normalize_embeddings=False)
+    return _l2_normalize(vecs.astype("float32", copy=False))
+
+
 def encode_text(q: str) -> np.ndarray:
     """
     文本 -> 向量 (float32, L2 归一化)
@@ -16,7 +16,8 @@ def _upsert_ocr(image_id: int, text: str) -> bool:
     return True
 
 def _add_vector(image_id: int, vec) -> bool:
-    fs = current_app.extensions.get("faiss_store")
+    from .. import get_faiss_store
+    fs = get_faiss_store(current_app)
     if fs is None:
         return False
     # Your FaissStore likely accepts just vectors; if it supports ID mapping, adapt here.
@@ -27,7 +28,8 @@ def _add_vector(image_id: int, vec) -> bool:
 
 def ingest_after_save(img: ImageModel, image_path: str):
     """Call this after Image row is created and file is saved."""
-    vm = current_app.extensions.get("vec_model")
+    from .. import get_vec_model
+    vm = get_vec_model(current_app)
     # 1) vector -> faiss
     try:
         if vm is not None:
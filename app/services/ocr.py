@@ -95,8 +95,12 @@ def _run_tesseract(path: str) -> str:
         if _TESSERACT_EXE:
             pytesseract.pytesseract.tesseract_cmd = _TESSERACT_EXE
         langs = _map_langs_tesseract(_OCR_LANGS)
-        with Image.open(path) as img:
-            txt = pytesseract.image_to_string(img, lang=langs)
+        if isinstance(path, str):
+            with Image.open(path) as img:
+                txt = pytesseract.image_to_string(img, lang=langs)
+        else:
+            # in-memory ndarray (easyocr/paddle take these natively)
+            txt = pytesseract.image_to_string(Image.fromarray(path), lang=langs)
         return _clean(txt)
     except Exception:
         return ""
@@ -167,7 +171,27 @@ def run_ocr(image_path: str) -> str:
         return _run_tesseract(image_path)
 
 
+def run_ocr_image(img) -> str:
+    """
+    Run OCR on an already-decoded image (PIL.Image or HWC uint8 ndarray),
+    so callers that decoded once for other consumers don't re-read the
+    file. easyocr and paddle take arrays natively; tesseract wraps via PIL.
+    """
+    try:
+        import numpy as np
+        if hasattr(img, "mode"):  # PIL -> array
+            img = np.asarray(img if img.mode == "RGB" else img.convert("RGB"))
+    except Exception:
+        return ""
+    return run_ocr(img)
+
+
 # Backward-compatible name (your old code called extract_text)
 def extract_text(image_path: str) -> str:
     """Alias of run_ocr(image_path)."""
     return run_ocr(image_path)
+
+
+def extract_text_image(img) -> str:
+    """Alias of run_ocr_image(img)."""
+    return run_ocr_image(img)
@@ -1,14 +1,54 @@
 # app/vec.py
+import io
+
 import numpy as np
 from PIL import Image
 from sentence_transformers import SentenceTransformer
 import torch
 
+
+# 常用模型的输出维度：既能在不加载权重时回答 dim，也用来校验配置没有错位
+_MODEL_DIM = {
+    "clip-ViT-B-32": 512,
+    "sentence-transformers/clip-ViT-B-32": 512,
+    "clip-ViT-L-14": 768,
+    "sentence-transformers/clip-ViT-L-14": 768,
+    "all-MiniLM-L6-v2": 384,
+}
+
+
+def known_dim(model_name: str | None) -> int | None:
+    """已知模型名对应的向量维度；未知返回 None。"""
+    return _MODEL_DIM.get(model_name or "")
+
+
+def _resolve_device(device: str | None) -> str:
+    """'auto'（或空）按 CUDA → MPS → CPU 顺序探测；显式指定则原样使用。"""
+    if device and device != "auto":
+        return device
+    if torch.cuda.is_available():
+        return "cuda"
+    mps = getattr(torch.backends, "mps", None)
+    if mps is not None and mps.is_available():
+        return "mps"
+    return "cpu"
+
+
 class VecModel:
-    def __init__(self, model_name: str = "clip-ViT-B-32", device: str = "cpu"):
-        self.model = SentenceTransformer(model_name, device=device)
-        # 统一输出维度
-        self.dim = self.model.get_sentence_embedding_dimension()
+    def __init__(self, model_name: str = "clip-ViT-B-32", device: str = "auto",
+                 batch_size: int = 64):
+        self.device = _resolve_device(device)
+        self.model = SentenceTransformer(model_name, device=self.device)
+        # 统一输出维度；与已知表不符说明模型/配置错位，宁可当场报错
+        # 也不要建出错维度的 FAISS 索引（那只能整库重建）
+        self.dim = int(self.model.get_sentence_embedding_dimension())
+        expected = known_dim(model_name)
+        if expected is not None and expected != self.dim:
+            raise RuntimeError(
+                f"model {model_name!r} reports dim={self.dim}, expected {expected}"
+            )
+        # GPU 上批量 encode 摊薄 kernel 启动开销
+        self.batch_size = int(batch_size)
 
     @torch.no_grad()
     def embed_image(self, path: str) -> np.ndarray:
@@ -17,6 +57,23 @@ class VecModel:
         vec = self.model.encode(img, convert_to_numpy=True, normalize_embeddings=True)
         return vec.astype("float32")
 
+    @torch.no_grad()
+    def embed_image_bytes(self, buf: bytes) -> np.ndarray:
+        """从内存字节直接编码（上传查询图不用先落盘再重读）。"""
+        img = Image.open(io.BytesIO(buf)).convert("RGB")
+        vec = self.model.encode(img, convert_to_numpy=True, normalize_embeddings=True)
+        return vec.astype("float32")
+
+    @torch.no_grad()
+    def embed_images(self, paths: list[str]) -> np.ndarray:
+        """批量版本：一次 forward 编码多张图，返回 (n, dim) float32。"""
+        imgs = [Image.open(p).convert("RGB") for p in paths]
+        vecs = self.model.encode(
+            imgs, batch_size=self.batch_size,
+            convert_to_numpy=True, normalize_embeddings=True,
+        )
+        return vecs.astype("float32")
+
     @torch.no_grad()
     def embed_text(self, text: str) -> np.ndarray:
         vec = self.model.encode([text], convert_to_numpy=True, normalize_embeddings=True)[0]
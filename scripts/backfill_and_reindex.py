@@ -67,15 +67,25 @@ print(f"[BACKFILL] inserted {inserted} embeddings")
 # 3) 全量重建 FAISS 索引
 print(f"[FAISS] rebuild @ {INDEX_PATH}")
 rows = db.session.execute(text(
-    "SELECT image_id, vector_blob FROM embedding ORDER BY image_id ASC"
+    "SELECT image_id, vector_blob, vector_scale FROM embedding ORDER BY image_id ASC"
 )).fetchall()
 if not rows:
     print("[FAISS] no embeddings, abort.")
     ctx.pop()
     sys.exit(0)
 
+
+def _decode(blob, scale):
+    # 与 models.Embedding.vector() 保持一致：vector_scale 非空的是
+    # int8 量化行，要先反量化；NULL 是旧的 float32 行
+    if scale is not None:
+        q = np.frombuffer(blob, dtype=np.int8)
+        return q.astype(np.float32) * (float(scale) / 127.0)
+    return np.frombuffer(blob, dtype=np.float32)
+
+
 ids = np.fromiter((int(r[0]) for r in rows), dtype=np.int64)
-vecs = np.vstack([np.frombuffer(r[1], dtype=np.float32) for r in rows])
+vecs = np.vstack([_decode(r[1], r[2]) for r in rows])
 if vecs.dtype != np.float32:
     vecs = vecs.astype(np.float32, copy=False)
 
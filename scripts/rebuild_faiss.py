@@ -23,7 +23,7 @@ INDEX_PATH = os.environ.get(
 with app.app_context():
     print(f"[DB] {app.config['SQLALCHEMY_DATABASE_URI']}")
     rows = (
-        db.session.query(Embedding.image_id, Embedding.dim, Embedding.vector_blob)
+        db.session.query(Embedding)
         .order_by(Embedding.image_id.asc())
         .all()
     )
@@ -32,13 +32,15 @@ with app.app_context():
 
     first_dim = None
     ids, vecs = [], []
-    for iid, dim, blob in rows:
-        v = np.frombuffer(blob, dtype="float32")
+    for rec in rows:
+        # Embedding.vector() 统一解码：int8 量化行（vector_scale 非空）
+        # 自动反量化，旧 float32 行原样返回
+        v = rec.vector()
         if first_dim is None:
-            first_dim = int(dim) if dim else v.shape[0]
+            first_dim = int(rec.dim) if rec.dim else v.shape[0]
         if v.shape[0] != first_dim:
-            raise RuntimeError(f"Embedding dim mismatch for id={iid}: got {v.shape[0]}, expect {first_dim}")
-        ids.append(int(iid))
+            raise RuntimeError(f"Embedding dim mismatch for id={rec.image_id}: got {v.shape[0]}, expect {first_dim}")
+        ids.append(int(rec.image_id))
         vecs.append(v)
 
     ids  = np.array(ids, dtype="int64")
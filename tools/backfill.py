@@ -144,7 +144,8 @@ def main():
                             vec = None
                     else:
                         try:
-                            arr = np.frombuffer(emb_row.vector_blob, dtype=np.float32)
+                            # vector() 兼容 int8 量化行与旧 float32 行
+                            arr = emb_row.vector()
                             if emb_row.dim and arr.size != emb_row.dim:
                                 arr = arr[:emb_row.dim]
                             vec = arr
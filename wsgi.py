@@ -0,0 +1,20 @@
+# wsgi.py
+# gunicorn 入口：配合 --preload 在 master 进程里先把 CLIP 模型加载好，
+# fork 出的 worker 通过 COW 共享权重页（N 个 worker ≈ 1 份模型内存）：
+#   gunicorn --preload -w $(nproc) wsgi:app
+import os
+
+from app import create_app, get_vec_model
+
+app = create_app(light=False)
+
+# PRELOAD_VEC=0 可关掉预热（比如单 worker 调试时想要快启动）
+if os.environ.get("PRELOAD_VEC", "1") == "1" and os.environ.get("LIGHT_MODE") != "1":
+    with app.app_context():
+        vm = get_vec_model(app)
+        if vm is not None:
+            # 推理模式，fork 之后不再改权重，保持页面只读可共享
+            try:
+                vm.model.eval()
+            except Exception:
+                pass